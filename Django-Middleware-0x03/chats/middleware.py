@@ -1,8 +1,11 @@
 # chats/middleware.py
 
 import logging
+import math
 import time
 from datetime import datetime, time as dt_time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponseForbidden
 from django.core.cache import cache
 
@@ -69,40 +72,151 @@ class RestrictAccessByTimeMiddleware:
         return response
 
 
+# --- RATE LIMITING ENGINE ---
+# A sliding-window counter kept in the cache with atomic operations.
+
+class SlidingWindowRateLimiter:
+    """
+    Allows at most `limit` hits per `window` seconds for each key.
+
+    Hits are counted in fixed buckets of `window` seconds with cache.add and
+    cache.incr, which are atomic on the locmem, memcached and Redis
+    backends, so concurrent requests in any number of workers cannot slip
+    past the limit. The current bucket is added to the previous one
+    weighted by how much of it still overlaps the window, which smooths
+    out bursts at bucket boundaries. A check costs the same few cache
+    operations whatever the limit.
+
+    Django's file-based cache implements incr as a read followed by a
+    write, so with it the limit is only approximate across processes.
+    """
+
+    def __init__(self, limit, window, prefix='rate_limit', cache=cache):
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+        self.cache = cache
+
+    def _bucket_key(self, key, bucket):
+        return f"{self.prefix}:{key}:{bucket}"
+
+    def hit(self, key, now=None):
+        """
+        Counts a hit for `key`. Returns (token, retry_after): `token` is
+        None when the hit is over the limit (and was not counted), otherwise
+        something that release() accepts; `retry_after` is how many seconds
+        to wait before trying again.
+        """
+        now = time.time() if now is None else now
+        bucket = int(now // self.window)
+        current_key = self._bucket_key(key, bucket)
+
+        # Buckets outlive their window by one more so the next one can
+        # still weigh them.
+        self.cache.add(current_key, 0, timeout=self.window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # The bucket expired between add and incr
+            self.cache.add(current_key, 1, timeout=self.window * 2)
+            current = 1
+        previous = self.cache.get(self._bucket_key(key, bucket - 1), 0)
+
+        overlap = 1 - (now - bucket * self.window) / self.window
+        if previous * overlap + current <= self.limit:
+            return current_key, 0
+
+        self.release(current_key)
+        current -= 1
+        if previous and current < self.limit:
+            # Room opens up once the previous bucket weighs little enough
+            retry_after = (overlap - (self.limit - current - 1) / previous) * self.window
+        else:
+            retry_after = (bucket + 1) * self.window - now
+        return None, max(1, math.ceil(retry_after))
+
+    def release(self, token):
+        """Takes back a hit counted by hit(), e.g. when another limit refused the request."""
+        try:
+            self.cache.decr(token)
+        except ValueError:
+            pass  # The bucket has expired already
+
+
 # --- MIDDLEWARE CLASS 3: Rate Limiting (Named OffensiveLanguageMiddleware) ---
-# This middleware limits the number of POST requests per IP address.
+# This middleware limits the number of requests per IP address, per user
+# and per route, as configured by the RATE_LIMITS setting.
 
 class OffensiveLanguageMiddleware:
-    # Class-level configuration for the rate limit.
+    """
+    Applies every rule of settings.RATE_LIMITS to each request and refuses
+    it as soon as one rule's limit is reached. A rule is a dict with:
+
+        'limit', 'window': at most `limit` requests per `window` seconds.
+        'scope': what is counted, 'ip' (the client address) or 'user'
+            (the authenticated user, so this middleware must come after
+            AuthenticationMiddleware; anonymous requests skip the rule).
+        'methods': the HTTP methods the rule applies to, POST by default.
+        'path': only apply the rule to paths starting with this prefix,
+            counting them apart from other routes; every path by default.
+
+    Without RATE_LIMITS, POST requests are limited to REQUEST_LIMIT per
+    TIME_WINDOW seconds for each IP address.
+    """
+    # Class-level configuration for the default rate limit.
     REQUEST_LIMIT = 5  # Max requests
     TIME_WINDOW = 60   # In seconds
 
+    SCOPES = ('ip', 'user')
+
     def __init__(self, get_response):
         self.get_response = get_response
+        rules = getattr(settings, 'RATE_LIMITS', None)
+        if rules is None:
+            rules = [{'scope': 'ip', 'limit': self.REQUEST_LIMIT, 'window': self.TIME_WINDOW}]
+        self.rules = []
+        for index, rule in enumerate(rules):
+            scope = rule.get('scope', 'ip')
+            if scope not in self.SCOPES:
+                raise ImproperlyConfigured(
+                    f"RATE_LIMITS[{index}] has unknown scope '{scope}', choose one of {self.SCOPES}"
+                )
+            methods = {method.upper() for method in rule.get('methods', ('POST',))}
+            path = rule.get('path', '/')
+            # Each rule counts in its own keys, so routes do not share budgets
+            limiter = SlidingWindowRateLimiter(rule['limit'], rule['window'],
+                                               prefix=f"rate_limit:{index}:{scope}")
+            self.rules.append((scope, methods, path, limiter))
+
+    def get_identity(self, request, scope):
+        """The value a rule of `scope` counts requests by, or None to skip it."""
+        if scope == 'ip':
+            return get_client_ip(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
 
     def __call__(self, request):
-        # This rate-limiting logic only applies to POST requests.
-        if request.method != 'POST':
-            return self.get_response(request)
+        counted = []
+        for scope, methods, path, limiter in self.rules:
+            if request.method not in methods or not request.path.startswith(path):
+                continue
+            identity = self.get_identity(request, scope)
+            if identity is None:
+                # Cannot rate-limit without an IP or a user, so let it pass.
+                continue
+            token, retry_after = limiter.hit(identity)
+            if token is None:
+                # The request is refused, so it does not count against the
+                # rules it already passed either.
+                for earlier, earlier_token in counted:
+                    earlier.release(earlier_token)
+                response = HttpResponseForbidden("Rate limit exceeded. Please try again later.")
+                response['Retry-After'] = str(retry_after)
+                return response
+            counted.append((limiter, token))
 
-        ip_address = get_client_ip(request)
-        if not ip_address:
-            # Cannot rate-limit without an IP, so let it pass.
-            return self.get_response(request)
-        
-        cache_key = f"rate_limit_{ip_address}"
-        request_history = cache.get(cache_key, [])
-        current_timestamp = time.time()
-        
-        # Filter out old timestamps to create a "sliding window".
-        valid_requests = [t for t in request_history if t > current_timestamp - self.TIME_WINDOW]
-        
-        if len(valid_requests) >= self.REQUEST_LIMIT:
-            return HttpResponseForbidden("Rate limit exceeded. Please try again later.")
-            
-        valid_requests.append(current_timestamp)
-        cache.set(cache_key, valid_requests, self.TIME_WINDOW + 5)
-        
         response = self.get_response(request)
         return response
 
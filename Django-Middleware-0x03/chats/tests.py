@@ -1,3 +1,107 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .middleware import OffensiveLanguageMiddleware, SlidingWindowRateLimiter
+
+
+class SlidingWindowRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = SlidingWindowRateLimiter(limit=5, window=60, prefix='test')
+
+    def hits(self, count, now):
+        return [self.limiter.hit('client', now=now)[0] is not None for _ in range(count)]
+
+    def test_allows_up_to_the_limit(self):
+        self.assertEqual(self.hits(7, now=600), [True] * 5 + [False] * 2)
+
+    def test_refused_hits_are_not_counted(self):
+        self.hits(20, now=600)
+        # Half way through the next bucket the previous one still weighs 2.5
+        self.assertEqual(self.hits(3, now=690), [True, True, False])
+
+    def test_window_slides(self):
+        self.hits(5, now=600)
+        self.assertEqual(self.hits(1, now=659), [False])
+        # A full window later the old hits no longer count
+        self.assertEqual(self.hits(5, now=720), [True] * 5)
+
+    def test_retry_after(self):
+        self.hits(5, now=600)
+        token, retry_after = self.limiter.hit('client', now=630)
+        self.assertIsNone(token)
+        self.assertEqual(retry_after, 30)
+
+    def test_release_gives_the_hit_back(self):
+        self.hits(4, now=600)
+        token, _ = self.limiter.hit('client', now=600)
+        self.limiter.release(token)
+        self.assertEqual(self.hits(2, now=600), [True, False])
+
+
+class RateLimitMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def make_middleware(self):
+        return OffensiveLanguageMiddleware(lambda request: HttpResponse('ok'))
+
+    def post(self, middleware, path='/api/conversations/', ip='10.0.0.1', user=None):
+        request = self.factory.post(path, REMOTE_ADDR=ip)
+        request.user = user if user is not None else AnonymousUser()
+        return middleware(request)
+
+    def test_default_limits_posts_per_ip(self):
+        middleware = self.make_middleware()
+        codes = [self.post(middleware).status_code for _ in range(6)]
+        self.assertEqual(codes, [200] * 5 + [403])
+        self.assertIn('Retry-After', self.post(middleware))
+        # Other addresses and other methods are not affected
+        self.assertEqual(self.post(middleware, ip='10.0.0.2').status_code, 200)
+        get = self.factory.get('/api/conversations/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(middleware(get).status_code, 200)
+
+    @override_settings(RATE_LIMITS=[{'scope': 'user', 'limit': 2, 'window': 60}])
+    def test_limits_per_user(self):
+        middleware = self.make_middleware()
+        alice = mock.Mock(is_authenticated=True, pk=1)
+        bob = mock.Mock(is_authenticated=True, pk=2)
+        # The same user is limited from any address
+        codes = [self.post(middleware, ip=f'10.0.0.{i}', user=alice).status_code for i in range(3)]
+        self.assertEqual(codes, [200, 200, 403])
+        self.assertEqual(self.post(middleware, user=bob).status_code, 200)
+        # Anonymous requests are not counted by a per-user rule
+        self.assertEqual([self.post(middleware).status_code for _ in range(3)], [200] * 3)
+
+    @override_settings(RATE_LIMITS=[
+        {'scope': 'ip', 'limit': 1, 'window': 60, 'path': '/api/conversations/'},
+        {'scope': 'ip', 'limit': 3, 'window': 60},
+    ])
+    def test_limits_per_route(self):
+        middleware = self.make_middleware()
+        self.assertEqual(self.post(middleware).status_code, 200)
+        self.assertEqual(self.post(middleware).status_code, 403)
+        # The refused request did not use up the general limit
+        codes = [self.post(middleware, path='/api-auth/login/').status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 403])
+
+    @override_settings(RATE_LIMITS=[{'scope': 'ip', 'limit': 5, 'window': 60}])
+    def test_limit_holds_under_parallel_posts(self):
+        middleware = self.make_middleware()
+        start = threading.Barrier(20)
+
+        def post(_):
+            start.wait()
+            return self.post(middleware).status_code
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            codes = list(executor.map(post, range(100)))
+        self.assertEqual(codes.count(200), 5)
+        self.assertEqual(codes.count(403), 95)
@@ -45,13 +45,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'chats.middleware.OffensiveLanguageMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
      'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # After AuthenticationMiddleware, so limits can be set per user
+    'chats.middleware.OffensiveLanguageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'chats.middleware.RolepermissionMiddleware',
     'chats.middleware.RestrictAccessByTimeMiddleware',
@@ -67,6 +68,16 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Request rate limits applied by chats.middleware.OffensiveLanguageMiddleware.
+# Each rule allows `limit` requests per `window` seconds, counted per client
+# IP or per authenticated user, for the given methods under the given path.
+RATE_LIMITS = [
+    {'scope': 'ip', 'limit': 5, 'window': 60, 'methods': ['POST']},
+    {'scope': 'user', 'limit': 30, 'window': 60, 'methods': ['POST'], 'path': '/api/'},
+]
+
+# The rate limits are counted in this cache. Use a shared backend (Redis or
+# memcached) when running several worker processes.
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
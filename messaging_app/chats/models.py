@@ -77,17 +77,22 @@ class Message(models.Model):
     # sender_id (Foreign Key to User)
     # A message has one sender.
     # on_delete=models.CASCADE means if a user is deleted, their messages are too.
+    # The (sender, sent_at) index below also serves lookups by sender alone.
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='sent_messages'
+        related_name='sent_messages',
+        db_index=False
     )
     
     # This message must belong to a conversation.
+    # The (conversation, sent_at, id) index below also serves lookups by
+    # conversation alone.
     conversation = models.ForeignKey(
         Conversation,
         on_delete=models.CASCADE,
-        related_name='messages'
+        related_name='messages',
+        db_index=False
     )
 
     # message_body (TEXT, NOT NULL)
@@ -98,8 +103,16 @@ class Message(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        # Order messages by when they were sent by default.
-        ordering = ['sent_at']
+        # Order messages by when they were sent by default. The id breaks
+        # ties, so the order is stable and matches the index below.
+        ordering = ['sent_at', 'id']
+        indexes = [
+            # A conversation's messages in order, and the cursor pages of
+            # MessageViewSet, are a range scan of this index with no sort.
+            models.Index(fields=['conversation', 'sent_at', 'id'], name='message_conversation_sent'),
+            # The messages a user sent, in order.
+            models.Index(fields=['sender', 'sent_at'], name='message_sender_sent'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.sent_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
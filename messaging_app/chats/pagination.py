@@ -0,0 +1,121 @@
+# messaging_app/chats/pagination.py
+
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Pages through a conversation's messages by position rather than by
+    offset, newest page first.
+
+    A cursor holds the (sent_at, id) of the message a page ends on and
+    the direction to go from there, so every page is an index range scan
+    of `page_size` rows: no COUNT(*), no OFFSET, and the thousandth page
+    of a long conversation costs the same as the first one. The id breaks
+    ties between messages sent in the same microsecond.
+
+    Each page lists its messages oldest first, with an `older` link to
+    scroll back in history and a `newer` link to come forward again.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    OLDER = 'older'
+    NEWER = 'newer'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            direction = self.OLDER
+            queryset = queryset.order_by('-sent_at', '-id')
+        else:
+            direction, sent_at, message_id = cursor
+            if direction == self.OLDER:
+                queryset = queryset.filter(
+                    Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, id__lt=message_id)
+                ).order_by('-sent_at', '-id')
+            else:
+                queryset = queryset.filter(
+                    Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, id__gt=message_id)
+                ).order_by('sent_at', 'id')
+
+        # One extra row tells whether there is anything past this page
+        messages = list(queryset[:page_size + 1])
+        has_more = len(messages) > page_size
+        messages = messages[:page_size]
+        if direction == self.OLDER:
+            messages.reverse()
+
+        # The side we came from always has messages; the cursor's own
+        # message is one of them.
+        if direction == self.OLDER:
+            has_older, has_newer = has_more, cursor is not None
+        else:
+            has_older, has_newer = True, has_more
+        self.older = self.encode_cursor(self.OLDER, messages[0]) if has_older and messages else None
+        self.newer = self.encode_cursor(self.NEWER, messages[-1]) if has_newer and messages else None
+        return messages
+
+    def get_paginated_response(self, data):
+        return Response({
+            'older': self.older,
+            'newer': self.newer,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        link = {'type': 'string', 'nullable': True, 'format': 'uri'}
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {'older': link, 'newer': link, 'results': schema},
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """
+        Returns the (direction, sent_at, id) held by the request's cursor,
+        or None on the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            direction, sent_at, message_id = base64.urlsafe_b64decode(
+                encoded.encode('ascii')
+            ).decode('ascii').split('|')
+            if direction not in (self.OLDER, self.NEWER):
+                raise ValueError(direction)
+            return direction, datetime.fromisoformat(sent_at), uuid.UUID(message_id)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, direction, message):
+        """Returns the URL of the page next to `message` in `direction`."""
+        position = f'{direction}|{message.sent_at.isoformat()}|{message.id}'
+        encoded = base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
@@ -1,8 +1,13 @@
 # messaging_app/chats/serializers.py
 
+from django.conf import settings
 from rest_framework import serializers
 from .models import User, Conversation, Message
 
+# How many of the latest messages a conversation embeds. The full history
+# is served, page by page, by the nested MessageViewSet.
+RECENT_MESSAGES = getattr(settings, 'CHATS_RECENT_MESSAGES', 10)
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for the User model.
@@ -39,8 +44,8 @@ class MessageSerializer(serializers.ModelSerializer):
 
 class ConversationSerializer(serializers.ModelSerializer):
     """
-    Serializer for the Conversation model, using a SerializerMethodField
-    for nested messages and custom validation.
+    Serializer for the Conversation model, using SerializerMethodFields
+    for a preview of the latest messages and custom validation.
     """
     # For writing, we'll accept a list of participant IDs.
     participants = serializers.PrimaryKeyRelatedField(
@@ -51,25 +56,41 @@ class ConversationSerializer(serializers.ModelSerializer):
     # For reading, we'll use a nested serializer to show full details.
     participants_details = UserSerializer(source='participants', many=True, read_only=True)
 
-    # Use SerializerMethodField to explicitly fetch and serialize messages.
-    messages = serializers.SerializerMethodField()
+    # Only the last RECENT_MESSAGES messages are embedded, with the total
+    # count, so the payload does not grow with the age of the conversation.
+    recent_messages = serializers.SerializerMethodField()
+    message_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'participants_details', 'created_at', 'messages']
+        fields = ['id', 'participants', 'participants_details', 'created_at',
+                  'recent_messages', 'message_count']
         extra_kwargs = {
             'participants': {'write_only': True}
         }
 
-    def get_messages(self, obj):
+    def get_recent_messages(self, obj):
+        """
+        Custom method to get the latest messages of a conversation, oldest
+        first. 'obj' is the Conversation instance.
+        """
+        # ConversationViewSet prefetches them newest first into
+        # `latest_messages`; query them here only when it did not.
+        messages = getattr(obj, 'latest_messages', None)
+        if messages is None:
+            messages = obj.messages.select_related('sender').order_by(
+                '-sent_at', '-id'
+            )[:RECENT_MESSAGES]
+        # Use the MessageSerializer to serialize them in the order they were sent.
+        return MessageSerializer(reversed(list(messages)), many=True).data
+
+    def get_message_count(self, obj):
         """
-        Custom method to get all messages for a conversation.
-        'obj' is the Conversation instance.
+        The number of messages in the conversation, annotated by
+        ConversationViewSet or counted on demand.
         """
-        # Filter messages related to the conversation and order them.
-        messages = obj.messages.all().order_by('sent_at')
-        # Use the MessageSerializer to serialize the queryset.
-        return MessageSerializer(messages, many=True).data
+        count = getattr(obj, 'message_count', None)
+        return obj.messages.count() if count is None else count
 
     def validate_participants(self, value):
         """
@@ -1,3 +1,241 @@
+from datetime import timedelta
+from itertools import cycle
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import User, Conversation, Message
+from .serializers import RECENT_MESSAGES
+
+
+class ChatTestCase(TestCase):
+    """
+    Signs alice in through an API client, with bob to talk to, and builds
+    conversations for them.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass')
+        self.other = User.objects.create_user(username='bob', password='pass')
+        self.client = APIClient()
+        # force_authenticate skips the session and user lookups
+        self.client.force_authenticate(user=self.user)
+
+    def make_conversation(self, *participants):
+        """A conversation between `participants`, alice and bob by default."""
+        conversation = Conversation.objects.create()
+        conversation.participants.add(*(participants or (self.user, self.other)))
+        return conversation
+
+    def make_messages(self, conversation, count, senders=None, per_second=1):
+        """
+        Sends `count` messages, 'message 0' first, taking turns between
+        `senders` (bob alone by default). sent_at is set on save, so the
+        messages are spread out afterwards, `per_second` to each second,
+        to give them a well defined order.
+        """
+        senders = cycle(senders or (self.other,))
+        start = timezone.now()
+        for i in range(count):
+            message = Message.objects.create(sender=next(senders), conversation=conversation,
+                                             message_body=f'message {i}')
+            Message.objects.filter(pk=message.pk).update(
+                sent_at=start + timedelta(seconds=i // per_second))
+
+
+class ConversationQueryCountTests(ChatTestCase):
+    """
+    Listing or retrieving conversations must run a fixed number of queries,
+    however many conversations, participants and messages there are.
+    """
+
+    # One query each for the conversations (with their message counts), their
+    # participants and their latest messages joined with the senders.
+    QUERY_BUDGET = 3
+
+    def make_conversations(self, count, messages_per_conversation=3):
+        conversations = []
+        for i in range(count):
+            other = User.objects.create_user(username=f'user{count}-{i}')
+            conversation = self.make_conversation(self.user, other)
+            self.make_messages(conversation, messages_per_conversation, senders=(other, self.user))
+            conversations.append(conversation)
+        return conversations
+
+    def test_list_query_count_does_not_grow_with_conversations(self):
+        self.make_conversations(1)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get('/api/conversations/')
+        self.assertEqual(response.status_code, 200)
+
+        self.make_conversations(50)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get('/api/conversations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 51)
+
+    def test_retrieve_query_count(self):
+        conversation, = self.make_conversations(1)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(f'/api/conversations/{conversation.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['recent_messages']), 3)
+
+    def test_messages_are_ordered_and_show_their_sender(self):
+        conversation, = self.make_conversations(1, messages_per_conversation=4)
+        response = self.client.get(f'/api/conversations/{conversation.id}/')
+        messages = response.data['recent_messages']
+        self.assertEqual([m['message_body'] for m in messages],
+                         ['message 0', 'message 1', 'message 2', 'message 3'])
+        self.assertEqual(messages[1]['sender'], 'alice')
+        self.assertEqual(response.data['message_count'], 4)
+
+    def test_message_list_joins_the_sender(self):
+        conversation, = self.make_conversations(1, messages_per_conversation=10)
+        # The conversation messages and the senders come from a single query
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/conversations/{conversation.id}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class RecentMessagesPreviewTests(ChatTestCase):
+    """
+    Conversations embed only their latest RECENT_MESSAGES messages and a
+    count; the full history is paged through the messages endpoint.
+    """
+
+    def make_conversation_with(self, message_count):
+        conversation = self.make_conversation()
+        self.make_messages(conversation, message_count)
+        return conversation
+
+    def test_long_conversation_embeds_only_the_latest_messages(self):
+        conversation = self.make_conversation_with(RECENT_MESSAGES * 3)
+        response = self.client.get(f'/api/conversations/{conversation.id}/')
+        self.assertEqual(response.data['message_count'], RECENT_MESSAGES * 3)
+        self.assertEqual(
+            [m['message_body'] for m in response.data['recent_messages']],
+            [f'message {i}' for i in range(RECENT_MESSAGES * 2, RECENT_MESSAGES * 3)],
+        )
+
+    def test_each_conversation_in_a_list_is_bounded(self):
+        long = self.make_conversation_with(RECENT_MESSAGES + 5)
+        short = self.make_conversation_with(2)
+        empty = self.make_conversation_with(0)
+        response = self.client.get('/api/conversations/')
+        by_id = {c['id']: c for c in response.data}
+        self.assertEqual(len(by_id[str(long.id)]['recent_messages']), RECENT_MESSAGES)
+        self.assertEqual(by_id[str(long.id)]['message_count'], RECENT_MESSAGES + 5)
+        self.assertEqual(len(by_id[str(short.id)]['recent_messages']), 2)
+        self.assertEqual(by_id[str(empty.id)]['recent_messages'], [])
+        self.assertEqual(by_id[str(empty.id)]['message_count'], 0)
+
+    def test_created_conversation_has_an_empty_preview(self):
+        response = self.client.post('/api/conversations/',
+                                    {'participants': [str(self.user.id), str(self.other.id)]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['recent_messages'], [])
+        self.assertEqual(response.data['message_count'], 0)
+
+
+class MessageCursorPaginationTests(ChatTestCase):
+    """
+    Messages are paged by (sent_at, id) cursors in both directions,
+    without COUNT(*) or OFFSET queries.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.conversation = self.make_conversation()
+        self.url = f'/api/conversations/{self.conversation.id}/messages/'
+
+        # Messages sent in pairs within the same instant, so the pages have
+        # to fall back on the id to keep their place
+        self.make_messages(self.conversation, 25, per_second=2)
+        self.expected = [
+            m.message_body for m in Message.objects.filter(conversation=self.conversation)
+            .order_by('sent_at', 'id')
+        ]
+
+    def bodies(self, response):
+        return [m['message_body'] for m in response.data['results']]
+
+    def test_first_page_is_the_newest_messages_oldest_first(self):
+        response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(self.bodies(response), self.expected[-10:])
+        self.assertIsNone(response.data['newer'])
+        self.assertIsNotNone(response.data['older'])
+
+    def test_scrolling_back_and_forth_visits_every_message_once(self):
+        pages = [self.client.get(self.url, {'page_size': 10})]
+        while pages[-1].data['older']:
+            pages.append(self.client.get(pages[-1].data['older']))
+        self.assertEqual([len(self.bodies(page)) for page in pages], [10, 10, 5])
+        self.assertEqual(sum((self.bodies(page) for page in reversed(pages)), []), self.expected)
+
+        # Coming forward again from the oldest page
+        self.assertIsNone(pages[-1].data['older'])
+        forward = [pages[-1]]
+        while forward[-1].data['newer']:
+            forward.append(self.client.get(forward[-1].data['newer']))
+        self.assertEqual(sum((self.bodies(page) for page in forward), []), self.expected)
+
+    def test_pages_do_not_count_or_skip_rows(self):
+        first = self.client.get(self.url, {'page_size': 10})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data['older'])
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class MessageIndexTests(ChatTestCase):
+    """
+    The message list queries are range scans of the composite indexes
+    added in 0002_message_composite_indexes, with no sort step.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.conversation = self.make_conversation()
+        self.make_messages(self.conversation, 30)
+
+    def plan_of(self, url, params=None):
+        """Runs EXPLAIN over the message query a request to `url` makes."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        sql = queries[-1]['sql']
+        self.assertIn('chats_message', sql)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return ' '.join(str(row[-1]) for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN {sql}')
+            return ' '.join(' '.join(map(str, row)) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(index, plan)
+        # How each backend reports sorting the rows after reading them
+        for sort in ('TEMP B-TREE', 'Using filesort', 'Sort Key'):
+            self.assertNotIn(sort, plan)
+
+    def test_message_pages_use_the_conversation_index(self):
+        url = f'/api/conversations/{self.conversation.id}/messages/'
+        first = self.client.get(url, {'page_size': 10})
+        older = self.client.get(first.data['older'])
+        for page_url in (url, first.data['older'], older.data['newer']):
+            self.assertUsesIndex(self.plan_of(page_url), 'message_conversation_sent')
 
-# Create your tests here.
+    def test_messages_by_sender_use_the_sender_index(self):
+        queryset = Message.objects.filter(sender=self.other).order_by('sent_at')[:10]
+        plan = queryset.explain()
+        self.assertUsesIndex(plan, 'message_sender_sent')
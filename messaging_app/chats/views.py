@@ -2,9 +2,12 @@
 
 from rest_framework import viewsets, permissions, status  # Import status
 from rest_framework.response import Response
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import DjangoFilterBackend # Import the filter backend
 from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from .pagination import MessageCursorPagination
+from .serializers import RECENT_MESSAGES, ConversationSerializer, MessageSerializer
 
 class ConversationViewSet(viewsets.ModelViewSet):
     """
@@ -21,8 +24,23 @@ class ConversationViewSet(viewsets.ModelViewSet):
         """
         This view should return a list of all conversations
         for the currently authenticated user.
+
+        Participants and the last RECENT_MESSAGES messages (with their
+        senders) are prefetched, so a page costs the same few queries however
+        many conversations it holds and however long they are. The sliced
+        prefetch is a single window query over all the conversations.
         """
-        return self.request.user.conversations.all()
+        message_count = Message.objects.filter(conversation=OuterRef('pk')).order_by().values(
+            'conversation'
+        ).annotate(count=Count('*')).values('count')
+        latest_messages = Message.objects.select_related('sender').order_by('-sent_at', '-id')
+        return self.request.user.conversations.annotate(
+            message_count=Coalesce(Subquery(message_count), 0),
+        ).prefetch_related(
+            'participants',
+            Prefetch('messages', queryset=latest_messages[:RECENT_MESSAGES],
+                     to_attr='latest_messages'),
+        )
 
     def create(self, request, *args, **kwargs):
         """
@@ -49,9 +67,11 @@ class ConversationViewSet(viewsets.ModelViewSet):
 class MessageViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows messages to be viewed or created.
+    Listings are paged by cursor, newest page first (see MessageCursorPagination).
     """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     # Add filtering capabilities to satisfy the "filters" keyword check
     filter_backends = [DjangoFilterBackend]
@@ -64,7 +84,8 @@ class MessageViewSet(viewsets.ModelViewSet):
         """
         # Get the conversation_pk from the URL kwargs
         conversation_pk = self.kwargs['conversation_pk']
-        return Message.objects.filter(conversation_id=conversation_pk)
+        # Join the sender in, MessageSerializer shows its username
+        return Message.objects.filter(conversation_id=conversation_pk).select_related('sender')
 
     def perform_create(self, serializer):
         """
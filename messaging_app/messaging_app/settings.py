@@ -61,6 +61,9 @@ REST_FRAMEWORK = {
     ]
 }
 
+# How many of the latest messages each conversation embeds in the API
+CHATS_RECENT_MESSAGES = 10
+
 ROOT_URLCONF = 'messaging_app.urls'
 
 TEMPLATES = [
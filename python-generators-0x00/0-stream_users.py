@@ -1,58 +1,206 @@
 #!/usr/bin/env python3
 """
-Module with a generator function to stream users from a MySQL database.
+Module with a generator function to stream users from the database.
 """
-import os
-import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from backends import Error
 
-# Load environment variables from .env file
-load_dotenv()
+# Connections are borrowed from the pool shared through the seed module
+seed = __import__('seed')
 
-# Database Configuration
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = "ALX_prodev"
-
-def stream_users():
+def stream_users(row_format='dict', limit=None):
     """
     A generator that connects to the user_data table and yields rows
     one by one as dictionaries.
-    
-    This function uses an unbuffered cursor to ensure that data is
-    streamed from the server without being fully loaded into memory.
+
+    This function uses a streaming cursor (see seed.streaming_cursor) to
+    ensure that data is streamed from the server without being fully
+    loaded into memory.
+
+    Pass row_format='tuple' or 'namedtuple' (see seed.ROW_FORMATS) to get
+    cheaper (user_id, name, email, age) rows instead of dictionaries.
+
+    `limit` caps the number of rows in the query itself. A caller that
+    wants fewer rows without knowing how many up front can close the
+    generator (or wrap it in contextlib.closing); the query is then
+    cancelled rather than read to the end.
     """
-    connection = None
-    cursor = None
+    convert = seed.row_converter(row_format)
+    query, params = seed.select_users(), ()
+    if limit is not None:
+        query, params = f"{query} LIMIT %s", (int(limit),)
     try:
-        # Establish connection to the database
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        
-        # Use an unbuffered cursor for true streaming
-        cursor = connection.cursor(dictionary=True, buffered=False)
-        
-        query = "SELECT user_id, name, email, age FROM user_data"
-        cursor.execute(query)
-        
-        # This is the single loop that iterates over the generator cursor
-        for row in cursor:
-            # The row is already a dictionary thanks to `dictionary=True`
-            # The 'age' field is a Decimal, convert it to a standard int
-            row['age'] = int(row['age'])
-            yield row
+        # Borrow a connection; it goes back to the pool when the block exits
+        with seed.pooled_connection() as connection:
+            # Use the backend's streaming cursor (unbuffered on MySQL)
+            cursor = seed.streaming_cursor(connection)
+            finished = False
+            try:
+                cursor.execute(query, params)
+
+                # This is the single loop that iterates over the generator cursor
+                for row in cursor:
+                    # Build the requested row shape; the 'age' field is a
+                    # Decimal and is converted to a standard int on the way
+                    yield convert(row)
+                finished = True
+            finally:
+                # Ensure resources are closed properly, cancelling the
+                # query if the caller stopped early
+                seed.close_streaming_cursor(connection, cursor, finished)
 
     except Error as e:
         print(f"A database error occurred: {e}")
+
+
+# Markers a scan worker puts on its queue once it is finished or has failed
+_DONE = object()
+_FAILED = object()
+
+
+def _key_ranges(connection, shards):
+    """
+    Splits the user_id key space into `shards` contiguous ranges.
+
+    user_id is a UUID, so the range between the smallest and largest key
+    is cut into equal slices of the 128-bit space. The first and last
+    range are left open so no row falls outside of them.
+
+    Returns:
+        list: (low, high) pairs where either bound may be None.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT {seed.user_id_sql('MIN(user_id)')}, "
+                       f"{seed.user_id_sql('MAX(user_id)')} FROM user_data")
+        lowest, highest = cursor.fetchone()
+    finally:
+        cursor.close()
+    if lowest is None:
+        return []
+
+    low, high = uuid.UUID(lowest).int, uuid.UUID(highest).int + 1
+    bounds = [str(uuid.UUID(int=low + (high - low) * i // shards)) for i in range(1, shards)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _put(out, item, stop):
+    """Blocks until `item` fits in `out`, giving up once `stop` is set."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_range(pool, low, high, out, stop, batch_size, convert):
+    """Streams one key range into `out` in batches of rows, on a connection from `pool`."""
+    conditions, params = [], []
+    if low is not None:
+        conditions.append(f"user_id >= {seed.user_id_param()}")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"user_id < {seed.user_id_param()}")
+        params.append(high)
+    query = seed.select_users()
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    try:
+        with pool.connection() as connection:
+            cursor = seed.streaming_cursor(connection, batch_size)
+            finished = False
+            try:
+                cursor.execute(query, params)
+                while not stop.is_set():
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        finished = True
+                        break
+                    if not _put(out, [convert(row) for row in rows], stop):
+                        break
+            finally:
+                # An abandoned scan cancels its query rather than reading on
+                seed.close_streaming_cursor(connection, cursor, finished)
+        _put(out, _DONE, stop)
+    except BaseException as e:
+        _put(out, (_FAILED, e), stop)
+
+
+def stream_users_parallel(workers=4, ordered=False, max_pending=64, batch_size=500,
+                          row_format='dict'):
+    """
+    A generator that scans user_data on several connections at once and
+    yields rows one by one as dictionaries.
+
+    The table is split into user_id ranges which are scanned concurrently
+    by a pool of `workers` threads, on a connection pool of `workers`
+    connections of its own, so the scan neither waits for nor starves the
+    shared pool. Rows reach the caller through bounded queues: at most
+    about `max_pending` batches of `batch_size` rows are buffered, and
+    scanners wait while the caller is behind.
+
+    Unlike stream_users, a database error is raised to the caller rather
+    than printed, so a failed scan can never pass for a complete one.
+
+    Args:
+        workers (int): Number of ranges scanned at the same time.
+        ordered (bool): Yield the ranges one after the other in user_id
+            order instead of as soon as any scanner produces rows.
+        max_pending (int): Upper bound on buffered batches.
+        batch_size (int): Rows fetched per round trip by each scanner.
+        row_format (str): One of seed.ROW_FORMATS.
+
+    Yields:
+        dict: A user row, as produced by stream_users.
+    """
+    convert = seed.row_converter(row_format)
+    stop = threading.Event()
+    executor = None
+    pool = seed.ConnectionPool(size=workers)
+    try:
+        with pool.connection() as connection:
+            # Unordered scans use more, smaller ranges so a slow range does
+            # not hold the whole export back; ordered scans use one range
+            # per worker so every buffered batch has a running scanner.
+            ranges = _key_ranges(connection, workers if ordered else workers * 4)
+        if not ranges:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        if ordered:
+            per_range = max(1, max_pending // workers)
+            outputs = [queue.Queue(maxsize=per_range) for _ in ranges]
+        else:
+            shared = queue.Queue(maxsize=max_pending)
+            outputs = [shared] * len(ranges)
+        for (low, high), out in zip(ranges, outputs):
+            executor.submit(_scan_range, pool, low, high, out, stop, batch_size, convert)
+
+        # Ordered: drain each range's queue in turn. Unordered: drain the
+        # shared queue until every range has reported that it is done.
+        pending = list(outputs) if ordered else [shared]
+        remaining = len(ranges)
+        while remaining:
+            item = pending[0].get()
+            if item is _DONE:
+                remaining -= 1
+                if ordered:
+                    pending.pop(0)
+                continue
+            if isinstance(item, tuple) and item[0] is _FAILED:
+                raise item[1]
+            yield from item
+
     finally:
-        # Ensure resources are closed properly
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
\ No newline at end of file
+        # Tell the scanners to stop and wait for them to hand back their
+        # connections, even when the caller abandons the generator early.
+        stop.set()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        pool.close()
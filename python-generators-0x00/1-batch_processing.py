@@ -3,75 +3,187 @@
 Module to fetch and process user data in batches.
 This script contains no 'return' statements.
 """
-import os
-import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
+import queue
+import threading
+import time
+from backends import Error
 
-# Load environment variables from .env file
-load_dotenv()
+# Connections are borrowed from the pool shared through the seed module
+seed = __import__('seed')
+sinks = __import__('sinks')
 
-# Database Configuration
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = "ALX_prodev"
 
-def stream_users_in_batches(batch_size=50):
+class StallStats:
+    """
+    Where a read-ahead stream spends its time waiting.
+
+    producer_wait is how long the fetching thread sat on a full queue
+    (the consumer is the bottleneck); consumer_wait is how long the
+    consumer waited for a batch (the database is the bottleneck).
+    """
+
+    def __init__(self):
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+        self.batches = 0
+
+
+# Put on the read-ahead queue once the result set is exhausted
+_END = object()
+
+
+def _read_ahead(cursor, batch_size, depth, stats, convert_batch, user_query):
+    """
+    A generator that fetches batches with fetchmany on a background thread,
+    keeping up to `depth` batches ready ahead of the consumer.
+    """
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def offer(item):
+        # Wait for room in the queue, unless the consumer has gone away
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def produce():
+        # apply() sees one batch at a time, so a limit the SQL could not
+        # carry is counted down here
+        remaining = user_query.limit if user_query.needs_python else None
+        try:
+            while not stop.is_set():
+                rows = cursor.fetchmany(batch_size) if remaining != 0 else []
+                if rows:
+                    rows = list(user_query.apply(rows))
+                    if remaining is not None:
+                        rows = rows[:remaining]
+                        remaining -= len(rows)
+                    if not rows:
+                        # Every row was dropped by a Python-side filter
+                        continue
+                batch = convert_batch(rows) if rows else _END
+                started = time.perf_counter()
+                offer(batch)
+                stats.producer_wait += time.perf_counter() - started
+                if batch is _END:
+                    break
+        except Exception as e:
+            offer(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            started = time.perf_counter()
+            batch = batches.get()
+            stats.consumer_wait += time.perf_counter() - started
+            if isinstance(batch, Exception):
+                raise batch
+            if batch is _END:
+                break
+            stats.batches += 1
+            yield batch
+    finally:
+        # Stop the producer before the caller closes the cursor under it
+        stop.set()
+        producer.join()
+
+
+def stream_users_in_batches(batch_size=50, prefetch=0, stats=None, row_format='dict',
+                            filters=None, columns=None, limit=None, raise_errors=False):
     """
     A generator that yields user data in batches.
     It exclusively uses 'yield' to produce values and does not use 'return'.
+
+    With prefetch > 0 the next batches are fetched on a background thread
+    while the current one is being processed, up to `prefetch` batches
+    ahead. Pass a StallStats as `stats` to find out which side waited.
+
+    `row_format` is one of seed.BATCH_FORMATS: a list of dicts by default,
+    a list of tuples or UserRow namedtuples, or 'columns' for a single
+    dict holding one list (and an array('H') of ages) per column.
+
+    `filters`, `columns` and `limit` describe which users, which columns
+    and how many rows to fetch (see seed.UserQuery). Filters are evaluated
+    by the database whenever they can be, and in Python otherwise.
+
+    Closing the generator early, e.g. through contextlib.closing, cancels
+    the query instead of reading the rows that are left.
+
+    A database error is printed and ends the stream, which then looks
+    complete. Callers that must tell a truncated stream apart set
+    `raise_errors` to have the error raised instead.
     """
-    connection = None
-    cursor = None
+    user_query = seed.UserQuery(filters, columns, limit)
+    convert_batch = seed.batch_converter(row_format, user_query.columns)
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        cursor = connection.cursor(dictionary=True, buffered=False)
-        
-        query = "SELECT user_id, name, email, age FROM user_data"
-        cursor.execute(query)
-
-        batch = []
-        # Loop 1: Iterates through the database cursor
-        for row in cursor:
-            row['age'] = int(row['age'])
-            batch.append(row)
-            if len(batch) >= batch_size:
-                yield batch  # Produces a batch
-                batch = []
-
-        # Yield the final, possibly smaller, batch after the loop.
-        # The function ends here, and the generator naturally stops.
-        if batch:
-            yield batch
+        with seed.pooled_connection() as connection:
+            cursor = seed.streaming_cursor(connection, batch_size)
+            finished = False
+            try:
+                cursor.execute(user_query.sql, user_query.params)
+
+                if prefetch > 0:
+                    yield from _read_ahead(cursor, batch_size, prefetch,
+                                           stats if stats is not None else StallStats(),
+                                           convert_batch, user_query)
+                else:
+                    batch = []
+                    # Loop 1: Iterates through the database cursor
+                    for row in user_query.apply(cursor):
+                        batch.append(row)
+                        if len(batch) >= batch_size:
+                            yield convert_batch(batch)  # Produces a batch
+                            batch = []
+
+                    # Yield the final, possibly smaller, batch after the loop.
+                    # The function ends here, and the generator naturally stops.
+                    if batch:
+                        yield convert_batch(batch)
+
+                # A limit applied in Python can stop before the last row
+                finished = user_query.limit is None or not user_query.needs_python
+            finally:
+                # The finally block ensures the cursor is closed (and the
+                # `with` hands the connection back), but it does not
+                # contain a 'return' statement.
+                seed.close_streaming_cursor(connection, cursor, finished)
 
     except Error as e:
+        if raise_errors:
+            raise
         print(f"A database error occurred: {e}")
-    finally:
-        # The finally block ensures resources are closed, but it does not
-        # contain a 'return' statement.
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-def batch_processing(batch_size=50):
+# The users batch_processing prints unless told otherwise
+OVER_25 = (('age', '>', 25),)
+
+
+def batch_processing(batch_size=50, filters=OVER_25, columns=None, sink=None):
     """
     Processes batches from the generator. This is a standard function,
     not a generator, and it completes its task without needing to 'return' a value.
+
+    Only users matching `filters` are fetched; by default that is users
+    over 25, which the database selects rather than Python. Each batch is
+    handed to `sink` in one go (see the sinks module); the default
+    PrintSink prints every user followed by a blank line. Processing stops early
+    once the sink is closed, e.g. when the output pipe goes away.
     """
+    if sink is None:
+        sink = sinks.PrintSink()
     # Loop 2: Iterates through the batches from the generator
-    for batch in stream_users_in_batches(batch_size=batch_size):
-        # Loop 3: Iterates through users in a single batch
-        for user in batch:
-            if user['age'] > 25:
-                # Processes data by printing. No value is returned.
-                print(user)
-                print()
-    # The function implicitly ends here after the loop is exhausted.
\ No newline at end of file
+    batches = stream_users_in_batches(batch_size=batch_size, filters=filters, columns=columns)
+    try:
+        for batch in batches:
+            # Processes data by handing the whole batch to the sink. No value is returned.
+            sink.write_batch(batch)
+            if sink.closed:
+                break
+    finally:
+        batches.close()
+        sink.close()
+    # The function implicitly ends here after the loop is exhausted.
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 
-from itertools import islice
 stream_users = __import__('0-stream_users').stream_users
 
-# Iterate over the generator function and print only the first 6 rows
+# Only the first 6 rows are wanted, so the query itself asks for 6 rows.
+# Closing a stream early (islice, contextlib.closing) cancels the query
+# instead of reading the rest of the table.
 print("Streaming the first 6 users from the database:")
-for user in islice(stream_users(), 6):
-    print(user)
\ No newline at end of file
+for user in stream_users(limit=6):
+    print(user)
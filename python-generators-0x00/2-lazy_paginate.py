@@ -2,69 +2,316 @@
 """
 Module for lazily paginating user data from a database.
 """
-# Import the seed module to get access to the database connection functions
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from backends import Error
+
+# Import the seed module to get access to the shared connection pool
 seed = __import__('seed')
 
-def paginate_users(page_size, offset):
+# --- Page Cache Configuration ---
+# How long a cached page may be served, and how many pages and bytes the
+# cache may hold. PAGE_CACHE_TTL=0 turns the cache off.
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "5"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Columns that may drive keyset pagination. Each one is backed by a unique
+# index, so "WHERE key > last_key ORDER BY key" is a plain index range scan.
+KEYSET_COLUMNS = ('user_id', 'email')
+
+
+class PageCache:
+    """
+    A thread-safe read-through cache of pages, keyed by query and parameters.
+
+    Entries expire `ttl` seconds after they were fetched. Beyond
+    `max_entries` pages or `max_bytes` (estimated) the least recently used
+    pages are evicted. Writes made through seed.insert_data clear the
+    cache; writes from other processes show up once the TTL has passed.
+
+    Attributes:
+        hits, misses, evictions, expirations (int): Counters for
+            monitoring, also returned by stats().
+    """
+
+    def __init__(self, ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_MAX_ENTRIES,
+                 max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._pages = OrderedDict()   # key -> (expires, size, rows)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """Returns the cached rows for `key`, or None."""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, size, rows = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key, rows):
+        """Caches `rows` under `key`, evicting old pages to make room."""
+        size = _estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._pages:
+                self._remove(key)
+            self._pages[key] = (time.monotonic() + self.ttl, size, rows)
+            self._bytes += size
+            while len(self._pages) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every cached page."""
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the counters and the current size of the cache."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'entries': len(self._pages),
+                    'bytes': self._bytes}
+
+    def _remove(self, key):
+        self._bytes -= self._pages.pop(key)[1]
+
+
+def _estimate_size(rows):
+    """
+    Roughly how many bytes a list of raw row tuples takes. Only the first
+    row is measured: the rows of a page have the same columns and values
+    of similar sizes, so the page takes about len(rows) times as much.
+    """
+    if not rows:
+        return sys.getsizeof(rows)
+    first = rows[0]
+    row_size = sys.getsizeof(first) + sum(sys.getsizeof(value) for value in first)
+    return sys.getsizeof(rows) + row_size * len(rows)
+
+
+# The cache shared by direct paginate_users and paginate_users_after calls.
+# lazy_paginate bypasses it: a walk over the whole table would only evict
+# the pages that are requested again and again. New rows written by
+# seed.insert_data invalidate it.
+page_cache = PageCache()
+seed.on_user_data_change(page_cache.clear)
+
+
+def paginate_users(page_size, offset, row_format='dict', cache=True):
     """
     Fetches a single page of users from the database.
-    
+
     Args:
         page_size (int): The number of users to fetch.
         offset (int): The starting point from which to fetch users.
-    
+        row_format (str): One of seed.ROW_FORMATS.
+        cache (bool): Serve the page from page_cache when it is there.
+
     Returns:
         list: A list of user dictionaries.
     """
-    # Use the provided function to connect to the 'ALX_prodev' database
-    connection = seed.connect_to_prodev()
-    if not connection:
-        print("Database connection failed.")
-        return []
-
-    cursor = connection.cursor(dictionary=True)
-    
     # Safely cast page_size and offset to int to prevent SQL injection issues
-    query = f"SELECT * FROM user_data LIMIT {int(page_size)} OFFSET {int(offset)}"
-    cursor.execute(query)
-    
-    rows = cursor.fetchall()
-    
-    # The 'age' column is a Decimal, convert it to int for consistency
-    for row in rows:
-        row['age'] = int(row['age'])
+    query = f"{seed.select_users()} LIMIT {int(page_size)} OFFSET {int(offset)}"
+    return _fetch_page(query, row_format=row_format, cache=cache)
+
+
+def paginate_users_after(page_size, last_key=None, key='user_id', row_format='dict',
+                         cache=True):
+    """
+    Fetches the page of users that comes right after `last_key`.
+
+    Unlike paginate_users, the server seeks straight to `last_key` through
+    the index instead of reading and throwing away `offset` rows, so the
+    last page of the table costs the same as the first one.
+
+    Args:
+        page_size (int): The number of users to fetch.
+        last_key: The `key` value of the last user already seen,
+            or None to start from the beginning.
+        key (str): The indexed column to order and resume by.
+        row_format (str): One of seed.ROW_FORMATS.
+        cache (bool): Serve the page from page_cache when it is there.
 
-    cursor.close()
-    connection.close()
-    return rows
+    Returns:
+        list: A list of user dictionaries ordered by `key`.
+    """
+    if key not in KEYSET_COLUMNS:
+        raise ValueError(f"Cannot paginate by '{key}', choose one of {KEYSET_COLUMNS}")
+
+    # The column name comes from KEYSET_COLUMNS, only the values are parameters.
+    # ORDER BY names the table column so the index is used, not the alias.
+    if last_key is None:
+        query = f"{seed.select_users()} ORDER BY user_data.{key} LIMIT %s"
+        return _fetch_page(query, (int(page_size),), row_format, cache)
+    placeholder = seed.user_id_param() if key == 'user_id' else "%s"
+    query = f"{seed.select_users()} WHERE {key} > {placeholder} ORDER BY user_data.{key} LIMIT %s"
+    return _fetch_page(query, (last_key, int(page_size)), row_format, cache)
 
 
-def lazy_paginate(page_size):
+def _fetch_page(query, params=(), row_format='dict', cache=True):
+    """
+    Runs a page query on a pooled connection and returns its rows, going
+    through page_cache unless `cache` is off.
+    """
+    convert = seed.row_converter(row_format)
+    # The raw rows are cached, so one entry serves every row format
+    cache_key = (query, tuple(params))
+    rows = page_cache.get(cache_key) if cache and page_cache.enabled else None
+    if rows is None:
+        try:
+            with seed.pooled_connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(query, params)
+                    rows = [tuple(row) for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+        except Error as e:
+            print(f"A database error occurred: {e}")
+            return []
+        if cache and page_cache.enabled:
+            page_cache.put(cache_key, rows)
+
+    # The 'age' column is a Decimal, the converter turns it into an int
+    return [convert(row) for row in rows]
+
+
+def _key_of(row, key):
+    """Reads the `key` column from a row in any of seed.ROW_FORMATS."""
+    if isinstance(row, dict):
+        return row[key]
+    return row[seed.USER_COLUMNS.index(key)]
+
+
+def encode_cursor(key, last_key):
+    """
+    Packs the position after a page into an opaque, URL-safe token.
+
+    Args:
+        key (str): The column the pagination is ordered by.
+        last_key: The value of that column on the last row of the page.
+
+    Returns:
+        str: A token that lazy_paginate accepts through `cursor=`.
+    """
+    payload = json.dumps({'key': key, 'after': last_key}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(token):
+    """
+    Unpacks a token made by encode_cursor.
+
+    Returns:
+        tuple: (key, last_key)
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        key, last_key = payload['key'], payload['after']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+    if key not in KEYSET_COLUMNS:
+        raise ValueError(f"Invalid pagination cursor: unknown key '{key}'")
+    return key, last_key
+
+
+class Page(list):
+    """
+    A page of users that also remembers where it ended.
+
+    `cursor` is the token to pass back to lazy_paginate to continue
+    right after this page, e.g. after a crashed export is restarted.
+    """
+
+    def __init__(self, rows, cursor=None):
+        super().__init__(rows)
+        self.cursor = cursor
+
+
+def lazy_paginate(page_size, keyset=False, key='user_id', cursor=None, row_format='dict',
+                  limit=None):
     """
     A generator that lazily fetches paginated data.
     It yields one page at a time, calling paginate_users only when the
     next page is requested.
 
+    With keyset=True (or when resuming from a `cursor`) pages are fetched
+    with paginate_users_after instead, and each page is a Page whose
+    `cursor` attribute resumes the walk after it.
+
     Args:
         page_size (int): The number of users per page.
+        keyset (bool): Seek by `key` instead of using LIMIT/OFFSET.
+        key (str): The indexed column used in keyset mode.
+        cursor (str): A token from a previous Page to resume from.
+        row_format (str): One of seed.ROW_FORMATS.
+        limit (int): Stop after this many users in total. The last page
+            asks the database for only the rows still wanted.
 
     Yields:
         list: A page (list of user dictionaries).
     """
+    if cursor is not None:
+        keyset = True
+        key, last_key = decode_cursor(cursor)
+    else:
+        last_key = None
+
     offset = 0
+    remaining = limit
     # --- This is the single required loop ---
-    while True:
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
         # Fetch the next page of users. This is the "lazy" part.
         # This database call only happens when the loop continues.
-        page = paginate_users(page_size=page_size, offset=offset)
+        # Each page is read once, so it is not worth a place in page_cache
+        if keyset:
+            page = paginate_users_after(page_size=size, last_key=last_key, key=key,
+                                        row_format=row_format, cache=False)
+        else:
+            page = paginate_users(page_size=size, offset=offset, row_format=row_format,
+                                  cache=False)
 
         # If the returned page is empty, it means we have reached the end
         # of the data. We break the loop to stop the generator.
         if not page:
             break
 
+        if keyset:
+            # Remember where this page ended so the next one seeks past it
+            last_key = _key_of(page[-1], key)
+            page = Page(page, cursor=encode_cursor(key, last_key))
+
         # Yield the fetched page and pause execution until the next one is requested
         yield page
 
         # Prepare the offset for the next iteration
-        offset += page_size
\ No newline at end of file
+        offset += page_size
+        if remaining is not None:
+            remaining -= len(page)
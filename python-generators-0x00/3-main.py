@@ -1,17 +1,13 @@
 #!/usr/bin/env python3
-import sys
 # Corrected the import to match the function name
 lazy_paginator = __import__('2-lazy_paginate').lazy_paginate
+sinks = __import__('sinks')
 
-try:
+# Each page is written in one go; the blank line after every user matches the example.
+# The sink stops quietly when piped to `head`, which closes the pipe early.
+with sinks.PrintSink() as sink:
     # This loop will request one page at a time from the generator
     for page in lazy_paginator(100):
-        # This inner loop just prints the users from the received page
-        for user in page:
-            # The extra print creates the blank line from the example
-            print(user)
-            print()
-
-except BrokenPipeError:
-    # This handles the error when piping to `head`
-    sys.stderr.close()
\ No newline at end of file
+        sink.write_batch(page)
+        if sink.closed:
+            break
@@ -3,74 +3,217 @@
 A memory-efficient script to calculate the average age of users
 by streaming data from a database using a generator.
 """
-import os
-import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
+from array import array
+from collections import Counter
+from backends import Error, get_backend
 
-# Load environment variables from .env file
-load_dotenv()
+try:
+    import numpy
+except ImportError:  # NumPy is optional, array('H') is used without it
+    numpy = None
 
-# Database Configuration
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = "ALX_prodev"
+# Connections are borrowed from the pool shared through the seed module
+seed = __import__('seed')
 
-def stream_user_ages():
+def stream_user_ages(limit=None):
     """
     A generator that connects to the database and yields user ages one by one.
     This is memory-efficient as it does not load all ages at once.
 
+    `limit` caps the number of ages in the query itself. Closing the
+    generator early cancels the query instead of reading it to the end.
+
     Yields:
         int: The age of a user.
     """
-    connection = None
-    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        # Use an unbuffered cursor to stream results from the server
-        cursor = connection.cursor(buffered=False)
-        
-        # We only need the 'age' column, which is more efficient
-        query = "SELECT age FROM user_data"
-        cursor.execute(query)
-
-        # --- LOOP 1: Iterates over the database cursor ---
-        for row in cursor:
-            # The row is a tuple, e.g., (Decimal('35'),). Get the first item.
-            yield int(row[0])
+        with seed.pooled_connection() as connection:
+            # Use a streaming cursor so results are not loaded all at once
+            cursor = seed.streaming_cursor(connection)
+            finished = False
+            try:
+                # We only need the 'age' column, which is more efficient
+                query, params = "SELECT age FROM user_data", ()
+                if limit is not None:
+                    query, params = f"{query} LIMIT %s", (int(limit),)
+                cursor.execute(query, params)
+
+                # --- LOOP 1: Iterates over the database cursor ---
+                for row in cursor:
+                    # The row is a tuple, e.g., (Decimal('35'),). Get the first item.
+                    yield int(row[0])
+                finished = True
+            finally:
+                seed.close_streaming_cursor(connection, cursor, finished)
 
     except Error as e:
         print(f"A database error occurred: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-def calculate_average_age():
+# The aggregations aggregate_ages knows how to compute
+AGGREGATES = ('avg', 'min', 'max', 'count', 'histogram')
+
+
+def aggregate_ages(func='avg', predicate=None, bucket_size=10, chunk_size=10000, use_stats=True):
     """
-    Calculates the average age of all users by consuming the
-    stream_user_ages generator, without loading all data into memory.
+    Computes an aggregate over the ages in user_data.
+
+    Without a predicate the work is pushed down to the database and only
+    a single row (or one row per bucket) crosses the wire. A Python
+    `predicate` cannot be translated to SQL, so in that case rows are
+    streamed in `fetchmany` blocks and reduced a block at a time. Both
+    paths return exactly the same values.
+
+    When use_stats is on and no predicate is given, the answer is read
+    from the running statistics tables that seed maintains on insert
+    (see seed.create_stats_tables), which costs no scan of user_data.
+    Backends without them (SQLite, PostgreSQL) and MySQL databases where
+    they are missing aggregate user_data itself.
+
+    Args:
+        func (str): One of AGGREGATES.
+        predicate (callable): Optional filter called with each
+            (user_id, name, email, age) row tuple.
+        bucket_size (int): Width of the age buckets for 'histogram'.
+        chunk_size (int): Rows fetched per block on the streaming path.
+        use_stats (bool): Read the statistics tables when they exist.
+
+    Returns:
+        The average as a float, min/max/count as an int, or for
+        'histogram' a dict mapping each bucket's lowest age to its count.
+        avg/min/max are None when no user matches.
     """
-    total_age = 0
-    user_count = 0
+    if func not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate '{func}', choose one of {AGGREGATES}")
+    try:
+        with seed.pooled_connection() as connection:
+            if predicate is None:
+                if use_stats and get_backend().maintains_stats:
+                    try:
+                        return _aggregate_from_stats(connection, func, bucket_size)
+                    except Error as e:
+                        if not get_backend().is_missing_table(e):
+                            raise
+                        # The failed query may have aborted the transaction
+                        # (PostgreSQL refuses every statement after it)
+                        connection.rollback()
+                return _aggregate_in_sql(connection, func, bucket_size)
+            return _aggregate_streaming(connection, func, predicate, bucket_size, chunk_size)
+    except Error as e:
+        print(f"A database error occurred: {e}")
+        return None
+
+
+def _aggregate_from_stats(connection, func, bucket_size):
+    """Answers from user_stats and user_age_histogram instead of user_data."""
+    cursor = connection.cursor()
+    try:
+        if func in ('count', 'avg'):
+            cursor.execute("SELECT user_count, age_sum FROM user_stats WHERE id = 1")
+            count, total = cursor.fetchone() or (0, 0)
+            return _summarize(func, int(count), int(total), None, None)
+        if func == 'histogram':
+            cursor.execute(
+                "SELECT FLOOR(age / %s) * %s AS bucket, SUM(user_count) FROM user_age_histogram "
+                "WHERE user_count > 0 GROUP BY bucket ORDER BY bucket",
+                (bucket_size, bucket_size)
+            )
+            return {int(bucket): int(count) for bucket, count in cursor.fetchall()}
+        cursor.execute("SELECT MIN(age), MAX(age) FROM user_age_histogram WHERE user_count > 0")
+        lowest, highest = cursor.fetchone()
+    finally:
+        cursor.close()
+    return _summarize(func, None, None, lowest, highest)
+
 
-    # --- LOOP 2: Iterates over the ages yielded by the generator ---
-    for age in stream_user_ages():
-        total_age += age
-        user_count += 1
+def _aggregate_in_sql(connection, func, bucket_size):
+    """Lets the database do the aggregation and converts its Decimals back to ints."""
+    cursor = connection.cursor()
+    try:
+        if func == 'histogram':
+            cursor.execute(
+                "SELECT FLOOR(age / %s) * %s AS bucket, COUNT(*) FROM user_data "
+                "GROUP BY bucket ORDER BY bucket",
+                (bucket_size, bucket_size)
+            )
+            return {int(bucket): count for bucket, count in cursor.fetchall()}
+
+        # AVG() on a DECIMAL column is rounded by the server, so the average
+        # is derived from the exact SUM() and COUNT() instead.
+        cursor.execute("SELECT COUNT(*), SUM(age), MIN(age), MAX(age) FROM user_data")
+        count, total, lowest, highest = cursor.fetchone()
+    finally:
+        cursor.close()
+    return _summarize(func, count, int(total or 0), lowest, highest)
+
+
+def _aggregate_streaming(connection, func, predicate, bucket_size, chunk_size):
+    """Filters rows in Python and reduces the matching ages block by block."""
+    count = total = 0
+    lowest = highest = None
+    histogram = Counter()
+
+    cursor = seed.streaming_cursor(connection, chunk_size)
+    finished = False
+    try:
+        cursor.execute(seed.select_users())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                finished = True
+                break
+            # Ages fit in an unsigned short, which keeps each block compact
+            ages = array('H', (int(row[3]) for row in rows if predicate(row)))
+            if not ages:
+                continue
+            count += len(ages)
+            if numpy is not None:
+                block = numpy.frombuffer(ages, dtype=numpy.uint16)
+                total += int(block.sum(dtype=numpy.int64))
+                block_min, block_max = int(block.min()), int(block.max())
+                if func == 'histogram':
+                    buckets = numpy.bincount(block // bucket_size)
+                    histogram.update({
+                        int(b) * bucket_size: int(n) for b, n in enumerate(buckets) if n
+                    })
+            else:
+                total += sum(ages)
+                block_min, block_max = min(ages), max(ages)
+                if func == 'histogram':
+                    histogram.update(age // bucket_size * bucket_size for age in ages)
+            lowest = block_min if lowest is None else min(lowest, block_min)
+            highest = block_max if highest is None else max(highest, block_max)
+    finally:
+        # A failing predicate leaves rows unread
+        seed.close_streaming_cursor(connection, cursor, finished)
+
+    if func == 'histogram':
+        return dict(sorted(histogram.items()))
+    return _summarize(func, count, total, lowest, highest)
+
+
+def _summarize(func, count, total, lowest, highest):
+    """Picks the requested value out of the running totals."""
+    if func == 'count':
+        return count
+    if func == 'avg':
+        return total / count if count else None
+    value = lowest if func == 'min' else highest
+    return None if value is None else int(value)
+
+
+def calculate_average_age(predicate=None):
+    """
+    Calculates the average age of all users without loading all data
+    into memory.
+
+    The average is computed by the database unless a Python `predicate` is given,
+    in which case the ages are streamed and averaged block by block.
+    """
+    average_age = aggregate_ages('avg', predicate=predicate)
 
-    # Avoid division by zero if the database is empty
-    if user_count > 0:
-        average_age = total_age / user_count
+    # aggregate_ages returns None when there is nothing to average
+    if average_age is not None:
         # Print the result formatted to two decimal places
         print(f"Average age of users: {average_age:.2f}")
     else:
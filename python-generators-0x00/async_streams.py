@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+asyncio counterparts of the user streaming generators.
+
+The blocking generators run on a dedicated worker thread, so the event
+loop never waits on the database, and the next batch or page is fetched
+while the caller is still handling the current one. Rows have the same shape
+as with the blocking generators.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+batch_processing = __import__('1-batch_processing')
+lazy_pagination = __import__('2-lazy_paginate')
+
+# Returned by next() on the worker thread once the iterator is exhausted
+_END = object()
+
+
+async def iterate_in_thread(make_iterator, prefetch=1):
+    """
+    An async generator that drives a blocking iterator on a worker thread.
+
+    Every step of the iterator runs on the same single thread, in order,
+    so the iterator and the connection it holds are never used from two
+    threads at once. Up to `prefetch` items are requested ahead of the
+    one the caller is waiting for.
+
+    Args:
+        make_iterator (callable): Returns the blocking iterable to drive.
+        prefetch (int): How many items to fetch ahead of the caller.
+
+    Yields:
+        Whatever the blocking iterator yields.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    iterator = None
+    pending = deque()
+    try:
+        iterator = await loop.run_in_executor(executor, lambda: iter(make_iterator()))
+        while True:
+            # Keep the worker busy with the next items while we yield
+            while len(pending) <= prefetch:
+                pending.append(loop.run_in_executor(executor, next, iterator, _END))
+            item = await pending.popleft()
+            if item is _END:
+                break
+            yield item
+    finally:
+        # Fetches that have not started yet are dropped; closing the
+        # iterator is queued behind the one that may still be running.
+        for future in pending:
+            future.cancel()
+        if iterator is not None and hasattr(iterator, 'close'):
+            executor.submit(iterator.close)
+        executor.shutdown(wait=False)
+
+
+async def async_stream_users_in_batches(batch_size=50, prefetch=1, row_format='dict'):
+    """
+    Async version of stream_users_in_batches.
+
+    Yields:
+        list: A batch of user dictionaries.
+    """
+    batches = iterate_in_thread(
+        lambda: batch_processing.stream_users_in_batches(batch_size=batch_size,
+                                                         row_format=row_format),
+        prefetch=prefetch
+    )
+    try:
+        async for batch in batches:
+            yield batch
+    finally:
+        await batches.aclose()
+
+
+async def async_stream_users(batch_size=100, prefetch=1, row_format='dict'):
+    """
+    Async version of stream_users.
+
+    Rows are fetched from the worker thread `batch_size` at a time, so the
+    event loop is only handed over once per batch instead of once per row.
+
+    Yields:
+        dict: A user row, or a row in another of seed.ROW_FORMATS.
+    """
+    if row_format == 'columns':
+        raise ValueError("async_stream_users yields single rows, use a format from seed.ROW_FORMATS")
+    batches = async_stream_users_in_batches(batch_size, prefetch, row_format)
+    try:
+        async for batch in batches:
+            for row in batch:
+                yield row
+    finally:
+        await batches.aclose()
+
+
+async def async_lazy_paginate(page_size, prefetch=1, **kwargs):
+    """
+    Async version of lazy_paginate. Extra keyword arguments (keyset, key,
+    cursor, row_format) are passed on to lazy_paginate.
+
+    Yields:
+        list: A page of user dictionaries.
+    """
+    pages = iterate_in_thread(
+        lambda: lazy_pagination.lazy_paginate(page_size, **kwargs),
+        prefetch=prefetch
+    )
+    try:
+        async for page in pages:
+            yield page
+    finally:
+        await pages.aclose()
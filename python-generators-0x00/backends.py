@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Database backends for the python-generators-0x00 modules.
+
+Every module reaches the database through seed, and seed reaches it
+through the backend named by DB_BACKEND:
+
+    mysql      MySQL through mysql-connector-python (the default)
+    sqlite     a local SQLite file, for development and benchmarks
+               without a server
+    postgres   PostgreSQL through psycopg2
+
+A backend knows how to connect, how to stream a large result set with
+the least client memory, and the few pieces of SQL that differ between
+servers. Queries are always written with %s placeholders; the SQLite
+backend translates them to its own.
+"""
+import os
+import sqlite3
+import uuid
+from dotenv import load_dotenv
+
+try:
+    import mysql.connector
+    from mysql.connector import errorcode
+except ImportError:  # Only needed with DB_BACKEND=mysql
+    mysql = None
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except ImportError:  # Only needed with DB_BACKEND=postgres
+    psycopg2 = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- Database Configuration ---
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME", "ALX_prodev")
+
+# The database file used by the sqlite backend
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", f"{DB_NAME}.sqlite3")
+
+# Lets insert_data bulk load with LOAD DATA LOCAL INFILE (MySQL only). Off
+# by default because it also lets the server ask the client for local files.
+DB_ALLOW_LOCAL_INFILE = os.getenv("DB_ALLOW_LOCAL_INFILE", "0") == "1"
+
+
+class PoolError(Exception):
+    """Raised when no pooled connection becomes free in time."""
+
+
+class SchemaError(Exception):
+    """Raised when user_data no longer has the layout a statement was written for."""
+
+
+# The base error class of every installed driver, plus PoolError and
+# SchemaError. Catch `Error` to handle a database error whichever backend
+# raised it.
+Error = tuple(
+    cls for cls in (
+        PoolError,
+        SchemaError,
+        sqlite3.Error,
+        mysql.connector.Error if mysql else None,
+        psycopg2.Error if psycopg2 else None,
+    ) if cls is not None
+)
+
+
+def _server_settings(**extra):
+    """Connection keyword arguments from the environment, leaving out unset ones."""
+    settings = {'host': DB_HOST, 'port': DB_PORT and int(DB_PORT),
+                'user': DB_USER, 'password': DB_PASSWORD}
+    settings.update(extra)
+    return {name: value for name, value in settings.items() if value is not None}
+
+
+class Backend:
+    """
+    The operations seed needs from a database. Subclasses fill them in
+    for one driver.
+    """
+
+    name = None
+    # The insert_data strategies that work on this backend, fastest first
+    ingest_strategies = ('multi_values', 'executemany')
+    # Appended to CREATE TABLE statements
+    table_options = ""
+    # Whether triggers keep user_stats and user_age_histogram current
+    maintains_stats = False
+    # Whether unique text columns ignore case (MySQL's default collations do)
+    case_insensitive_unique = False
+    # Whether several connections can insert at the same time
+    concurrent_writes = True
+
+    def connect_server(self):
+        """Opens a connection to the server, outside of any database."""
+        raise NotImplementedError
+
+    def create_database(self, connection, name):
+        """Creates database `name` on the server if it does not exist."""
+        raise NotImplementedError
+
+    def connect(self):
+        """Opens a connection to DB_NAME, raising on failure."""
+        raise NotImplementedError
+
+    def streaming_cursor(self, connection, batch_size=1000):
+        """
+        Returns a cursor that hands rows over as the server produces them
+        instead of loading the whole result set first. `batch_size` is a
+        hint for how many rows to transfer per round trip.
+        """
+        raise NotImplementedError
+
+    def cancel(self, connection, cursor):
+        """
+        Closes a streaming cursor whose remaining rows are not wanted,
+        without reading them. SQLite and PostgreSQL cursors only fetch
+        when asked, so closing them is enough.
+        """
+        cursor.close()
+
+    def is_alive(self, connection):
+        """True if `connection` can still talk to the server."""
+        raise NotImplementedError
+
+    def reset(self, connection):
+        """
+        Prepares a connection to go back to the pool, rolling back any
+        open transaction. Returns False if it must be closed instead.
+        """
+        raise NotImplementedError
+
+    def is_missing_table(self, error):
+        """True if `error` says a table does not exist."""
+        return False
+
+    def local_infile_refused(self, error):
+        """True if `error` says LOAD DATA LOCAL INFILE is disabled."""
+        return False
+
+    def insert_ignore(self, table, columns, values):
+        """An INSERT of `values` rows that skips rows violating a unique key."""
+        raise NotImplementedError
+
+    def max_statement_size(self, cursor):
+        """The largest statement, in bytes, worth sending in one go."""
+        return 16 * 1024 * 1024
+
+    def max_params(self, connection):
+        """The most parameters a single statement may carry."""
+        return 65535
+
+
+class MySQLBackend(Backend):
+    """MySQL through mysql-connector-python, streaming with unbuffered cursors."""
+
+    name = 'mysql'
+    ingest_strategies = ('load_data', 'multi_values', 'executemany')
+    table_options = " ENGINE=InnoDB"
+    maintains_stats = True
+    case_insensitive_unique = True
+
+    def __init__(self):
+        if mysql is None:
+            raise ImportError("DB_BACKEND=mysql needs the mysql-connector-python package")
+
+    def connect_server(self):
+        return mysql.connector.connect(**_server_settings())
+
+    def create_database(self, connection, name):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {name}")
+        finally:
+            cursor.close()
+
+    def connect(self):
+        return mysql.connector.connect(**_server_settings(
+            database=DB_NAME, allow_local_infile=DB_ALLOW_LOCAL_INFILE
+        ))
+
+    def streaming_cursor(self, connection, batch_size=1000):
+        # An unbuffered cursor reads rows off the socket as they are fetched
+        return connection.cursor(buffered=False)
+
+    def cancel(self, connection, cursor):
+        # The server keeps sending rows until the query ends, and closing an
+        # unbuffered cursor would read them all first. Stop the query from
+        # a second connection instead; the pool then closes `connection`,
+        # which still has the tail of the result set unread.
+        try:
+            killer = self.connect()
+            try:
+                killer.cursor().execute(f"KILL QUERY {int(connection.connection_id)}")
+            finally:
+                killer.close()
+        except mysql.connector.Error:
+            pass  # The query ends when the connection is closed anyway
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass  # "Unread result found"
+
+    def is_alive(self, connection):
+        return connection.is_connected()
+
+    def reset(self, connection):
+        # A connection with an unread result cannot run another query
+        if connection.unread_result or not connection.is_connected():
+            return False
+        if connection.in_transaction:
+            connection.rollback()
+        return True
+
+    def is_missing_table(self, error):
+        return getattr(error, 'errno', None) == errorcode.ER_NO_SUCH_TABLE
+
+    def local_infile_refused(self, error):
+        return getattr(error, 'errno', None) in {
+            errorcode.ER_NOT_ALLOWED_COMMAND,
+            errorcode.ER_CLIENT_LOCAL_FILES_DISABLED,
+            errorcode.CR_LOAD_DATA_LOCAL_INFILE_REJECTED,
+        }
+
+    def insert_ignore(self, table, columns, values):
+        return f"INSERT IGNORE INTO {table} ({columns}) VALUES {values}"
+
+    def max_statement_size(self, cursor):
+        cursor.execute("SELECT @@max_allowed_packet")
+        # Leave headroom for the packet header and the statement itself
+        return int(cursor.fetchone()[0] * 0.9)
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    """A cursor accepting the %s placeholders the other drivers use."""
+
+    def execute(self, query, params=()):
+        return super().execute(query.replace('%s', '?'), params)
+
+    def executemany(self, query, seq_of_params):
+        return super().executemany(query.replace('%s', '?'), seq_of_params)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=_SQLiteCursor):
+        return super().cursor(factory)
+
+
+class SQLiteBackend(Backend):
+    """
+    A local SQLite file. Its cursors step through the table as rows are
+    fetched, so streaming needs nothing special.
+    """
+
+    name = 'sqlite'
+    # One writer at a time; the others would wait on the database lock
+    concurrent_writes = False
+
+    def connect_server(self):
+        # The file is the database; there is no server to connect to first
+        return self.connect()
+
+    def create_database(self, connection, name):
+        pass
+
+    def connect(self):
+        # Pooled connections are handed from thread to thread, but only
+        # ever used by one thread at a time.
+        connection = sqlite3.connect(DB_SQLITE_PATH, factory=_SQLiteConnection,
+                                     check_same_thread=False)
+        # WAL lets scans run while another connection inserts
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def streaming_cursor(self, connection, batch_size=1000):
+        cursor = connection.cursor()
+        cursor.arraysize = batch_size
+        return cursor
+
+    def is_alive(self, connection):
+        try:
+            connection.execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        return True
+
+    def is_missing_table(self, error):
+        return isinstance(error, sqlite3.OperationalError) and 'no such table' in str(error)
+
+    def insert_ignore(self, table, columns, values):
+        return f"INSERT OR IGNORE INTO {table} ({columns}) VALUES {values}"
+
+    def max_params(self, connection):
+        if hasattr(connection, 'getlimit'):
+            return connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        # The compile-time default of SQLite releases before 3.32
+        return 999
+
+
+class PostgresBackend(Backend):
+    """
+    PostgreSQL through psycopg2. Results are streamed from a server-side
+    named cursor, `itersize` rows per round trip; a plain psycopg2 cursor
+    would load the whole result set into memory first.
+    """
+
+    name = 'postgres'
+
+    def __init__(self):
+        if psycopg2 is None:
+            raise ImportError("DB_BACKEND=postgres needs the psycopg2 package")
+
+    def connect_server(self):
+        connection = psycopg2.connect(**_server_settings(dbname='postgres'))
+        # CREATE DATABASE cannot run inside a transaction
+        connection.autocommit = True
+        return connection
+
+    def create_database(self, connection, name):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if cursor.fetchone() is None:
+                cursor.execute(f'CREATE DATABASE "{name}"')
+        finally:
+            cursor.close()
+
+    def connect(self):
+        return psycopg2.connect(**_server_settings(dbname=DB_NAME))
+
+    def streaming_cursor(self, connection, batch_size=1000):
+        cursor = connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        return cursor
+
+    def is_alive(self, connection):
+        return connection.closed == 0
+
+    def reset(self, connection):
+        if connection.closed:
+            return False
+        # Also closes any named cursor left open in the transaction
+        if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        return True
+
+    def is_missing_table(self, error):
+        return getattr(error, 'pgcode', None) == '42P01'  # undefined_table
+
+    def insert_ignore(self, table, columns, values):
+        return f"INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT DO NOTHING"
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+    'postgres': PostgresBackend,
+}
+
+_backend = None
+
+def get_backend():
+    """Returns the backend named by DB_BACKEND, creating it on first use."""
+    global _backend
+    if _backend is None:
+        set_backend(os.getenv("DB_BACKEND", "mysql"))
+    return _backend
+
+def set_backend(name):
+    """Switches every module to backend `name`, one of BACKENDS."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose one of {tuple(BACKENDS)}")
+    _backend = BACKENDS[name]()
+    return _backend
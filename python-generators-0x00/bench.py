@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the python-generators-0x00 data access layer.
+
+The benchmarks fill user_data with synthetic users, so point DB_NAME
+at a scratch database before running them. --backend picks the database
+(see backends.py); sqlite needs no server:
+
+    DB_NAME=ALX_prodev_bench ./bench.py ages --rows 1000000
+    DB_NAME=ALX_prodev_bench DB_ALLOW_LOCAL_INFILE=1 ./bench.py ingest --sizes 100000
+    DB_NAME=ALX_prodev_bench ./bench.py suite --rows 1000000 --json results.json
+    DB_NAME=ALX_prodev_bench ./bench.py --backend sqlite suite --rows 1000000
+    DB_NAME=ALX_prodev_bench ./bench.py parallel --rows 1000000 --workers 1 2 4 8
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+backends = __import__('backends')
+seed = __import__('seed')
+stream_ages = __import__('4-stream_ages')
+
+
+def synthetic_users(count, start=0, prefix='bench.user'):
+    """
+    Yields `count` reproducible (user_id, name, email, age) rows.
+
+    The n-th user always gets the same name, email and age, so runs on
+    different machines or commits work on identical data.
+    """
+    for n in range(start, start + count):
+        rng = random.Random(n)
+        yield (seed.new_user_id(), f"Bench User {n}", f"{prefix}{n}@example.com",
+               rng.randint(1, 100))
+
+
+def ensure_rows(count, batch_size=10000):
+    """Creates the database and table if needed and tops user_data up to `count` rows."""
+    connection = seed.connect_db()
+    if not connection:
+        raise SystemExit("Cannot connect to the database server")
+    seed.create_database(connection)
+    connection.close()
+
+    connection = seed.connect_to_prodev()
+    if not connection:
+        raise SystemExit(f"Cannot connect to '{seed.DB_NAME}'")
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    missing = count - existing
+    if missing > 0:
+        print(f"Seeding {missing} synthetic users into '{seed.DB_NAME}'...")
+        insert_query = seed.insert_users_query()
+        users = synthetic_users(missing, start=existing)
+        while True:
+            batch = [user for _, user in zip(range(batch_size), users)]
+            if not batch:
+                break
+            cursor.executemany(insert_query, batch)
+            connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def timed(func, *args, **kwargs):
+    """Calls func and returns (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_ages(args):
+    """Compares the statistics-table, pushed-down and streaming paths of aggregate_ages."""
+    ensure_rows(args.rows)
+    # A predicate that keeps every row forces the streaming path while
+    # leaving the result comparable with the SQL one.
+    keep_all = lambda row: True
+
+    print(f"{'aggregate':<10} {'stats (s)':>10} {'sql (s)':>10} {'stream (s)':>11}")
+    for func in stream_ages.AGGREGATES:
+        from_stats, stats_time = timed(stream_ages.aggregate_ages, func)
+        in_sql, sql_time = timed(stream_ages.aggregate_ages, func, use_stats=False)
+        streamed, stream_time = timed(stream_ages.aggregate_ages, func, predicate=keep_all,
+                                      chunk_size=args.chunk_size)
+        if not from_stats == in_sql == streamed:
+            raise SystemExit(f"{func}: statistics returned {from_stats!r}, SQL returned "
+                             f"{in_sql!r} and streaming returned {streamed!r}")
+        print(f"{func:<10} {stats_time:>10.4f} {sql_time:>10.3f} {stream_time:>11.3f}")
+
+
+def write_synthetic_csv(path, count, prefix='bench.user', duplicates=0.0):
+    """
+    Writes `count` synthetic users to a CSV shaped like user_data.csv.
+    A `duplicates` share of the rows reuse the email of an earlier row,
+    with a name and age of their own.
+    """
+    rng = random.Random(count)
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+        writer.writerow(['name', 'email', 'age'])
+        for n, (_, name, email, age) in enumerate(synthetic_users(count, prefix=prefix)):
+            if n and rng.random() < duplicates:
+                email = f"{prefix}{rng.randrange(n)}@example.com"
+            writer.writerow([name, email, age])
+
+
+def bench_ingest(args):
+    """Times every insert_data strategy loading the same synthetic CSV."""
+    ensure_rows(0)
+    backend = backends.get_backend()
+    strategies = args.strategies or backend.ingest_strategies
+    # SQLite has no TRUNCATE; a DELETE without WHERE is just as fast there
+    clear_table = "DELETE FROM user_data" if backend.name == 'sqlite' else "TRUNCATE TABLE user_data"
+    print(f"{'rows':>10} {'strategy':<13} {'seconds':>9} {'rows/sec':>10} {'inserted':>10}")
+    for size in args.sizes:
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            write_synthetic_csv(path, size)
+            for strategy in strategies:
+                connection = seed.connect_to_prodev()
+                cursor = connection.cursor()
+                cursor.execute(clear_table)
+                connection.commit()
+                cursor.close()
+                report, elapsed = timed(seed.insert_data, connection, path,
+                                        batch_size=args.batch_size, progress=False,
+                                        strategy=strategy)
+                connection.close()
+                print(f"{size:>10} {strategy:<13} {elapsed:>9.2f} "
+                      f"{report.read / elapsed:>10.0f} {report.inserted:>10}")
+        finally:
+            os.remove(path)
+
+
+def bench_parallel(args):
+    """
+    Times insert_data_parallel with 1 to N workers on the same CSV and
+    checks that every run keeps exactly the same users (and, on MySQL,
+    leaves consistent statistics).
+    """
+    ensure_rows(0)
+    backend = backends.get_backend()
+    clear_table = "DELETE FROM user_data" if backend.name == 'sqlite' else "TRUNCATE TABLE user_data"
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_synthetic_csv(path, args.rows, duplicates=args.duplicates)
+        print(f"{'workers':>8} {'seconds':>9} {'rows/sec':>10} {'speedup':>8} {'inserted':>10}")
+        baseline = expected = None
+        for workers in args.workers:
+            connection = seed.connect_to_prodev()
+            cursor = connection.cursor()
+            cursor.execute(clear_table)
+            connection.commit()
+            if backend.maintains_stats:
+                # TRUNCATE does not run the delete triggers
+                seed.rebuild_user_stats(connection)
+            report, elapsed = timed(seed.insert_data_parallel, path, workers=workers,
+                                    batch_size=args.batch_size, progress=False)
+            # A fingerprint of which rows won: names and ages differ between
+            # the rows sharing an email
+            cursor.execute("SELECT COUNT(*), SUM(age), SUM(LENGTH(name)) FROM user_data")
+            fingerprint = tuple(int(value or 0) for value in cursor.fetchone())
+            cursor.close()
+            # The inserters keep the statistics in batches; they must still add up
+            problems = seed.check_user_stats(connection) if backend.maintains_stats else []
+            connection.close()
+            if problems:
+                raise SystemExit(f"{workers} workers left user_stats inconsistent: {problems}")
+            if expected is None:
+                baseline, expected = elapsed, fingerprint
+            elif fingerprint != expected:
+                raise SystemExit(f"{workers} workers kept {fingerprint}, 1st run kept {expected}")
+            print(f"{workers:>8} {elapsed:>9.2f} {report.read / elapsed:>10.0f} "
+                  f"{baseline / elapsed:>7.2f}x {report.inserted:>10}")
+    finally:
+        os.remove(path)
+
+
+def bench_schema(args):
+    """Compares insert rate and scans on the version 1 and version 2 table layouts."""
+    if backends.get_backend().name != 'mysql':
+        raise SystemExit("The schema benchmark compares MySQL table layouts, use --backend mysql")
+    ensure_rows(0)
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    print(f"{'layout':<8} {'insert rows/sec':>16} {'full scan (s)':>14} "
+          f"{'age range (s)':>14} {'age = 42 (s)':>13}")
+    for version in (1, 2):
+        table = f"bench_users_v{version}"
+        id_param = "UUID_TO_BIN(%s)" if version >= 2 else "%s"
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(seed.user_table_ddl(version, table))
+
+        insert_query = f"INSERT INTO {table} (user_id, name, email, age) VALUES ({id_param}, %s, %s, %s)"
+        started = time.perf_counter()
+        users = synthetic_users(args.rows)
+        while True:
+            batch = [(seed.new_user_id(version),) + user[1:]
+                     for _, user in zip(range(args.batch_size), users)]
+            if not batch:
+                break
+            cursor.executemany(insert_query, batch)
+            connection.commit()
+        insert_rate = args.rows / (time.perf_counter() - started)
+
+        def scan(query):
+            cursor.execute(query)
+            cursor.fetchall()
+
+        _, full_scan = timed(scan, f"SELECT user_id, name, email, age FROM {table}")
+        _, age_range = timed(scan, f"SELECT COUNT(*) FROM {table} WHERE age BETWEEN 30 AND 39")
+        _, age_point = timed(scan, f"SELECT user_id, name, email FROM {table} WHERE age = 42")
+        print(f"v{version:<7} {insert_rate:>16.0f} {full_scan:>14.3f} {age_range:>14.3f} {age_point:>13.3f}")
+        cursor.execute(f"DROP TABLE {table}")
+    cursor.close()
+    connection.close()
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Returns the nearest-rank percentiles of `samples`, plus their maximum."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f"p{point}": ordered[max(0, -(-len(ordered) * point // 100) - 1)] for point in points}
+    result['max'] = ordered[-1]
+    return result
+
+
+def reset_peak_rss():
+    """
+    Restarts peak RSS tracking from the current RSS, so memory used while
+    importing modules does not hide the peak of the code being measured.
+    Only Linux supports this; elsewhere the peak covers the whole process.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process, in KiB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(iterable, size=lambda item: 1, latencies=False):
+    """
+    Drains `iterable` and returns its throughput.
+
+    `size` tells how many rows an item holds. With latencies=True the time
+    spent waiting for every item is kept and summarized as percentiles;
+    this is meant for pages and batches, not for single rows.
+    """
+    rows = 0
+    first_row = None
+    waits = []
+    started = last = time.perf_counter()
+    for item in iterable:
+        now = time.perf_counter()
+        if first_row is None:
+            first_row = now - started
+        if latencies:
+            waits.append(now - last)
+        rows += size(item)
+        last = time.perf_counter()
+    elapsed = time.perf_counter() - started
+    result = {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else None,
+        'time_to_first_row': first_row,
+    }
+    if latencies:
+        result['items'] = len(waits)
+        result['latency'] = percentiles(waits)
+    return result
+
+
+def _batch_rows(batch):
+    # A 'columns' batch is a dict of equally long columns
+    return len(next(iter(batch.values()))) if isinstance(batch, dict) else len(batch)
+
+
+def run_stream_users(args):
+    stream = __import__('0-stream_users')
+    return measure(stream.stream_users(row_format=args.row_format))
+
+
+def run_stream_users_in_batches(args):
+    batches = __import__('1-batch_processing')
+    return measure(batches.stream_users_in_batches(batch_size=args.page_size,
+                                                   row_format=args.row_format),
+                   size=_batch_rows, latencies=True)
+
+
+def run_lazy_paginate(args):
+    pagination = __import__('2-lazy_paginate')
+    return measure(pagination.lazy_paginate(args.page_size, row_format=args.row_format),
+                   size=len, latencies=True)
+
+
+def run_lazy_paginate_keyset(args):
+    pagination = __import__('2-lazy_paginate')
+    return measure(pagination.lazy_paginate(args.page_size, keyset=True,
+                                            row_format=args.row_format),
+                   size=len, latencies=True)
+
+
+def run_stream_user_ages(args):
+    return measure(stream_ages.stream_user_ages())
+
+
+def run_insert_data(args):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    connection = seed.connect_to_prodev()
+    try:
+        # Fresh e-mail addresses, so every row is inserted rather than skipped
+        write_synthetic_csv(path, args.insert_rows, prefix='bench.insert')
+        started = time.perf_counter()
+        report = seed.insert_data(connection, path, batch_size=args.page_size,
+                                  progress=False)
+        elapsed = time.perf_counter() - started
+    finally:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM user_data WHERE email LIKE 'bench.insert%'")
+        connection.commit()
+        cursor.close()
+        connection.close()
+        os.remove(path)
+    return {
+        'rows': report.inserted,
+        'seconds': elapsed,
+        'rows_per_sec': report.read / elapsed if elapsed else None,
+        'skipped': report.skipped,
+    }
+
+
+# Each case runs in a process of its own, so peak RSS is not inherited
+# from the cases run before it
+SUITE_CASES = {
+    'stream_users': run_stream_users,
+    'stream_users_in_batches': run_stream_users_in_batches,
+    'lazy_paginate': run_lazy_paginate,
+    'lazy_paginate_keyset': run_lazy_paginate_keyset,
+    'stream_user_ages': run_stream_user_ages,
+    'insert_data': run_insert_data,
+}
+
+
+def _run_case(name, args, results):
+    try:
+        reset_peak_rss()
+        baseline = peak_rss_kb()
+        result = SUITE_CASES[name](args)
+        result['peak_rss_kb'] = peak_rss_kb()
+        result['rss_growth_kb'] = result['peak_rss_kb'] - baseline
+    except Exception as e:
+        result = {'error': f"{type(e).__name__}: {e}"}
+    results.put(result)
+
+
+def run_isolated(name, args):
+    """Runs one suite case in a fresh process and returns its measurements."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(name, args, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                result = {'error': f"process exited with code {process.exitcode}"}
+                break
+    process.join()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_suite(args):
+    """Measures every generator and insert_data, and reports the results as JSON."""
+    ensure_rows(args.rows)
+    report = {
+        'commit': _git_commit(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backends.get_backend().name,
+        'database': seed.DB_NAME,
+        'schema_version': seed.schema_version(),
+        'rows': args.rows,
+        'page_size': args.page_size,
+        'row_format': args.row_format,
+        'results': {},
+    }
+    for name in args.cases:
+        runs = [run_isolated(name, args) for _ in range(args.repeat)]
+        # Keep the fastest run; the others mostly measure noise
+        timed_runs = [run for run in runs if 'seconds' in run]
+        best = min(timed_runs, key=lambda run: run['seconds']) if timed_runs else runs[0]
+        report['results'][name] = best
+        if 'error' in best:
+            print(f"{name:<24} failed: {best['error']}", file=sys.stderr)
+        else:
+            print(f"{name:<24} {best['rows_per_sec'] or 0:>12.0f} rows/sec "
+                  f"{best['peak_rss_kb']:>9} KiB peak", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.json == '-':
+        print(output)
+    else:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=list(backends.BACKENDS),
+                        help="database backend, DB_BACKEND by default")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    ages = subparsers.add_parser('ages', help="aggregate_ages: statistics vs SQL pushdown vs streaming")
+    ages.add_argument('--rows', type=int, default=1000000)
+    ages.add_argument('--chunk-size', type=int, default=10000)
+    ages.set_defaults(run=bench_ages)
+
+    ingest = subparsers.add_parser('ingest', help="insert_data: compare ingest strategies")
+    ingest.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 10000000])
+    ingest.add_argument('--strategies', nargs='+', choices=seed.INGEST_STRATEGIES,
+                        help="the backend's strategies by default")
+    ingest.add_argument('--batch-size', type=int, default=50000)
+    ingest.set_defaults(run=bench_ingest)
+
+    parallel = subparsers.add_parser('parallel', help="insert_data_parallel: scaling with workers")
+    parallel.add_argument('--rows', type=int, default=1000000)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parallel.add_argument('--batch-size', type=int, default=5000)
+    parallel.add_argument('--duplicates', type=float, default=0.1,
+                          help="share of rows repeating an earlier email")
+    parallel.set_defaults(run=bench_parallel)
+
+    schema = subparsers.add_parser('schema', help="user_data layout: version 1 vs version 2")
+    schema.add_argument('--rows', type=int, default=1000000)
+    schema.add_argument('--batch-size', type=int, default=5000)
+    schema.set_defaults(run=bench_schema)
+
+    suite = subparsers.add_parser('suite', help="throughput, memory and latency of every generator")
+    suite.add_argument('--rows', type=int, default=1000000)
+    suite.add_argument('--insert-rows', type=int, default=100000)
+    suite.add_argument('--page-size', type=int, default=1000)
+    suite.add_argument('--row-format', choices=seed.ROW_FORMATS, default='dict')
+    suite.add_argument('--repeat', type=int, default=1)
+    suite.add_argument('--cases', nargs='+', choices=list(SUITE_CASES), default=list(SUITE_CASES))
+    suite.add_argument('--json', default='-', help="file to write the results to, '-' for stdout")
+    suite.set_defaults(run=bench_suite)
+
+    args = parser.parse_args()
+    if args.backend:
+        # Through the environment, so the processes the suite spawns use it too
+        os.environ['DB_BACKEND'] = args.backend
+        backends.set_backend(args.backend)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection for seed.insert_data.
+
+Rather than sending every CSV row and letting the UNIQUE(email) index
+reject the duplicates one by one, insert_data can load the emails already
+in user_data once, as 8-byte hashes, and drop rows that are already there
+or repeated in the file before they reach the server.
+
+Hashes can collide (and a Bloom filter answers "maybe"), so a row is only
+dropped after the server confirms its email exists, with one IN query per
+batch for the suspected duplicates.
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from itertools import islice
+
+from backends import get_backend
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, hashes are sorted in chunks without it
+    numpy = None
+
+# Above this many users the existing emails go into a Bloom filter instead
+# of a hash set: about 1.2 bytes per email instead of 8.
+BLOOM_THRESHOLD = 10000000
+
+# The false positive rate Bloom filters are sized for
+BLOOM_ERROR_RATE = 0.01
+
+DEDUP_MODES = ('auto', 'set', 'bloom')
+
+# How many hashes are sorted as Python ints at a time when NumPy is missing
+SORT_CHUNK = 250000
+
+
+def email_key(email):
+    """
+    The form of an email the unique index compares. MySQL's default
+    collations ignore case; SQLite and PostgreSQL compare exactly.
+    """
+    return email.lower() if get_backend().case_insensitive_unique else email
+
+
+def _hash(key):
+    return int.from_bytes(blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _sorted_hashes(hashes):
+    """
+    Collects an iterable of 64-bit hashes into a sorted array('Q') without
+    holding them all as Python ints. NumPy sorts the filled array in place;
+    without it SORT_CHUNK hashes are sorted at a time and the sorted runs
+    merged.
+    """
+    hashes = iter(hashes)
+    if numpy is not None:
+        values = array('Q')
+        while True:
+            size = len(values)
+            values.extend(islice(hashes, SORT_CHUNK))
+            if len(values) == size:
+                break
+        view = numpy.frombuffer(values, dtype=numpy.uint64)
+        view.sort()
+        del view   # the array cannot be resized while a view is exported
+        return values
+    runs = []
+    while True:
+        chunk = sorted(islice(hashes, SORT_CHUNK))
+        if not chunk:
+            break
+        runs.append(array('Q', chunk))
+    if len(runs) <= 1:
+        return runs[0] if runs else array('Q')
+    return array('Q', heapq.merge(*runs))
+
+
+def _merge_sorted(values, additions):
+    """Merges a sorted list of hashes into a sorted array('Q') in linear time."""
+    if numpy is not None:
+        current = numpy.frombuffer(values, dtype=numpy.uint64)
+        new = numpy.array(additions, dtype=numpy.uint64)
+        merged = array('Q')
+        merged.frombytes(numpy.insert(current, numpy.searchsorted(current, new), new))
+        return merged
+    return array('Q', heapq.merge(values, additions))
+
+
+class HashSet:
+    """
+    A set of 64-bit email hashes kept in a sorted array('Q'), 8 bytes per
+    email. Additions collect in a small Python set that is merged into
+    the array once it grows past `merge_every`.
+    """
+
+    def __init__(self, hashes=(), merge_every=100000):
+        self._sorted = _sorted_hashes(hashes)
+        self._recent = set()
+        self.merge_every = merge_every
+
+    def add(self, key):
+        self._recent.add(_hash(key))
+        if len(self._recent) >= self.merge_every:
+            self._sorted = _merge_sorted(self._sorted, sorted(self._recent))
+            self._recent.clear()
+
+    def __contains__(self, key):
+        value = _hash(key)
+        if value in self._recent:
+            return True
+        i = bisect_left(self._sorted, value)
+        return i < len(self._sorted) and self._sorted[i] == value
+
+    @property
+    def nbytes(self):
+        return self._sorted.itemsize * len(self._sorted) + 8 * len(self._recent)
+
+
+class BloomFilter:
+    """
+    A Bloom filter sized for `capacity` keys at `error_rate` false
+    positives. It never misses a key that was added.
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1000)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+
+class DedupStage:
+    """
+    Filters batches of (name, email, age) rows down to the users that are
+    new to user_data.
+
+    Counters, also returned by counts():
+        existing: rows whose email was in user_data before the load.
+        in_file: rows repeating an email seen earlier in the file.
+        false_positives: suspected duplicates the server did not know,
+            which were kept.
+    """
+
+    def __init__(self, connection, mode='auto', expected_rows=0):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{mode}', choose one of {DEDUP_MODES}")
+        self.existing = self.in_file = self.false_positives = 0
+        # How many emails one IN query may confirm
+        self._lookup_step = max(1, min(1000, get_backend().max_params(connection)))
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM user_data")
+            count = int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        if mode == 'auto':
+            mode = 'bloom' if count > BLOOM_THRESHOLD else 'set'
+        self.mode = mode
+
+        # One index for the emails already stored, one for those this
+        # load adds, so a confirmed duplicate can be told apart.
+        cursor = get_backend().streaming_cursor(connection, 10000)
+        try:
+            cursor.execute("SELECT email FROM user_data")
+            if mode == 'bloom':
+                self._stored = BloomFilter(count)
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    for (email,) in rows:
+                        self._stored.add(email_key(email))
+                self._loaded = BloomFilter(expected_rows)
+            else:
+                self._stored = HashSet(_hash(email_key(email)) for (email,) in cursor)
+                self._loaded = HashSet()
+        finally:
+            cursor.close()
+
+    def filter(self, cursor, rows):
+        """Returns the rows of a batch that are not duplicates, in file order."""
+        fresh, suspects = [], {}
+        batch_keys = set()
+        for row in rows:
+            key = email_key(row[1])
+            if key in batch_keys:
+                self.in_file += 1
+                continue
+            batch_keys.add(key)
+            if key in self._stored or key in self._loaded:
+                suspects[key] = row
+            fresh.append((key, row))
+        if not suspects:
+            return [row for _, row in fresh]
+
+        known = self._lookup(cursor, list(suspects))
+        kept = []
+        for key, row in fresh:
+            if key not in suspects:
+                kept.append(row)
+            elif key not in known:
+                self.false_positives += 1
+                kept.append(row)
+            elif key in self._loaded:
+                self.in_file += 1
+            else:
+                self.existing += 1
+        return kept
+
+    def added(self, rows):
+        """Records rows that were committed, so later batches skip them."""
+        for row in rows:
+            self._loaded.add(email_key(row[-2]))
+
+    def counts(self):
+        """The counters as a dict."""
+        return {'existing': self.existing, 'in_file': self.in_file,
+                'false_positives': self.false_positives}
+
+    def _lookup(self, cursor, keys):
+        """Returns which of `keys` user_data already has."""
+        known = set()
+        step = self._lookup_step
+        for start in range(0, len(keys), step):
+            part = keys[start:start + step]
+            cursor.execute(
+                f"SELECT email FROM user_data WHERE email IN ({', '.join(['%s'] * len(part))})", part
+            )
+            known.update(email_key(email) for (email,) in cursor.fetchall())
+        return known
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Exports user_data to a Parquet or Feather file for analytics.
+
+    ./export.py users.parquet
+    ./export.py users.feather --batch-size 100000 --columns user_id age
+
+Rows are streamed in the 'columns' batch format and each batch becomes
+one Arrow record batch (one Parquet row group), so no dict is built per
+row and memory stays bounded to a few batches however large the table
+is. Needs pyarrow.
+
+A failed export exits with an error and leaves no file behind.
+"""
+import argparse
+import os
+from backends import Error
+
+batch_processing = __import__('1-batch_processing')
+seed = __import__('seed')
+sinks = __import__('sinks')
+
+# The file formats export_users writes, by file extension
+EXPORT_FORMATS = {
+    '.parquet': sinks.ParquetSink,
+    '.feather': sinks.FeatherSink,
+    '.arrow': sinks.FeatherSink,
+}
+
+
+def export_users(path, batch_size=65536, filters=None, columns=None, compression=None,
+                 prefetch=1):
+    """
+    Writes the users matching `filters` to `path`.
+
+    The format follows the extension of `path` (see EXPORT_FORMATS). The
+    next batch is fetched while the current one is being written; at most
+    `prefetch` batches wait in between, so about prefetch + 2 batches are
+    in memory at any time.
+
+    Args:
+        path (str): The file to create.
+        batch_size (int): Rows per fetch, record batch and row group.
+        filters, columns: Which users and columns to export, as for
+            stream_users_in_batches.
+        compression (str): The codec, the sink's default when None.
+        prefetch (int): Batches fetched ahead of the writer.
+
+    Returns:
+        int: The number of users written.
+
+    Raises:
+        Error: The database failed before every user was written. The
+            partial file is removed, as it would pass for a full export.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Cannot export to '{path}', use one of {tuple(EXPORT_FORMATS)}")
+    columns = tuple(columns) if columns else seed.USER_COLUMNS
+    options = {} if compression is None else {'compression': compression}
+    sink = EXPORT_FORMATS[extension](path, columns, **options)
+
+    batches = batch_processing.stream_users_in_batches(
+        batch_size=batch_size, prefetch=prefetch, row_format='columns',
+        filters=filters, columns=columns, raise_errors=True
+    )
+    completed = False
+    try:
+        for batch in batches:
+            sink.write_batch(batch)
+        completed = True
+    finally:
+        batches.close()
+        sink.close()
+        if not completed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return sink.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help="output file, .parquet, .feather or .arrow")
+    parser.add_argument('--batch-size', type=int, default=65536)
+    parser.add_argument('--columns', nargs='+', choices=seed.USER_COLUMNS)
+    parser.add_argument('--compression')
+    args = parser.parse_args()
+    try:
+        rows = export_users(args.path, batch_size=args.batch_size, columns=args.columns,
+                            compression=args.compression)
+    except Error as e:
+        raise SystemExit(f"Export to '{args.path}' failed, no file was written: {e}")
+    print(f"{rows} users exported to '{args.path}'.")
+
+
+if __name__ == "__main__":
+    main()
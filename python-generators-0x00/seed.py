@@ -1,117 +1,1366 @@
 import os
 import csv
 import uuid
-import mysql.connector
-from mysql.connector import Error
-from dotenv import load_dotenv
+import queue
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from contextlib import contextmanager
 
-# Load environment variables from .env file
-load_dotenv()
+# Connection settings and driver specifics live in the backends module;
+# DB_BACKEND picks MySQL (the default), SQLite or PostgreSQL.
+from backends import (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_ALLOW_LOCAL_INFILE,
+                      Error, PoolError, SchemaError, get_backend)
+from dedup import DedupStage, email_key
 
-# --- Database Configuration ---
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = "ALX_prodev"
+# --- Connection Pool Configuration ---
+# How many connections may be open at once, how long a caller waits for a
+# free one, and whether an idle connection is pinged before it is reused.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_HEALTH_CHECK = os.getenv("DB_POOL_HEALTH_CHECK", "1") == "1"
+
+# Which user_data layout create_table builds. 1 is the original one keyed
+# by a VARCHAR(36) UUID; 2 stores time-ordered UUIDs as BINARY(16) and
+# indexes age (see migrate_to_v2). Version 2 needs MySQL. Queries follow
+# the layout of the table that exists (see schema_version).
+DB_SCHEMA_VERSION = int(os.getenv("DB_SCHEMA_VERSION", "1"))
 
 def connect_db():
-    """Connects to the MySQL database server."""
-    connection = None
+    """Connects to the database server."""
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return connection
+        return get_backend().connect_server()
     except Error as e:
-        print(f"Error while connecting to MySQL: {e}")
+        print(f"Error while connecting to the database server: {e}")
         return None
 
 def create_database(connection):
     """Creates the database ALX_prodev if it does not exist."""
-    cursor = connection.cursor()
     try:
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+        get_backend().create_database(connection, DB_NAME)
         print(f"Database '{DB_NAME}' created or already exists.")
     except Error as e:
         print(f"Error creating database: {e}")
-    finally:
-        cursor.close()
+
+def open_prodev_connection():
+    """Opens a new connection to the ALX_prodev database, raising on failure."""
+    return get_backend().connect()
 
 def connect_to_prodev():
-    """Connects to the ALX_prodev database in MySQL."""
+    """Connects to the ALX_prodev database."""
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
+        return open_prodev_connection()
     except Error as e:
         print(f"Error while connecting to '{DB_NAME}': {e}")
         return None
 
-def create_table(connection):
-    """Creates a table user_data if it does not exist with the required fields."""
-    cursor = connection.cursor()
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS user_data (
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of ALX_prodev connections.
+
+    Connections are opened lazily, up to `size` at a time. A caller that
+    finds the pool exhausted waits up to `timeout` seconds for a connection
+    to be released before a PoolError is raised. Idle connections are
+    pinged before being handed out again when `health_check` is on, and
+    dead ones are silently replaced.
+
+    `connect` is the factory used to open new connections; it defaults to
+    open_prodev_connection and can be swapped for a stand-in when testing.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 health_check=DB_POOL_HEALTH_CHECK, connect=None):
+        self.size = size
+        self.timeout = timeout
+        self.health_check = health_check
+        self._connect = connect or open_prodev_connection
+        # LIFO so the most recently used (and most likely alive) connection
+        # is reused first and the others are left to age out.
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout=None):
+        """Borrows a connection, opening a new one if none is idle."""
+        wait = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=wait):
+            raise PoolError(f"No free connection in the pool after {wait}s")
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if not self.health_check or get_backend().is_alive(connection):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard=False):
+        """
+        Returns a borrowed connection to the pool.
+
+        An open transaction is rolled back. A connection the backend cannot
+        reset (e.g. one with an unread result) is closed instead of being
+        reused.
+        """
+        try:
+            if discard or not get_backend().reset(connection):
+                self._discard(connection)
+                return
+            self._idle.put(connection)
+        except Error:
+            self._discard(connection)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrows a connection for the duration of a `with` block."""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Closes every idle connection held by the pool."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the pool shared by every streaming generator, creating it once."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def pooled_connection(timeout=None):
+    """Shortcut for `get_pool().connection()`."""
+    return get_pool().connection(timeout)
+
+# Callbacks run after new rows are committed to user_data, e.g. to drop caches
+_change_listeners = []
+
+def on_user_data_change(callback):
+    """Registers `callback` to be called with no arguments whenever insert_data adds users."""
+    _change_listeners.append(callback)
+
+def _notify_user_data_change():
+    for callback in _change_listeners:
+        callback()
+
+def streaming_cursor(connection, batch_size=1000):
+    """
+    Returns a cursor on `connection` that streams its result set rather
+    than loading it into memory, in the way the backend does it best
+    (an unbuffered cursor on MySQL, a named server-side cursor fetching
+    `batch_size` rows at a time on PostgreSQL).
+    """
+    return get_backend().streaming_cursor(connection, batch_size)
+
+def close_streaming_cursor(connection, cursor, finished):
+    """
+    Closes a cursor from streaming_cursor. When the caller stopped before
+    the end of the result set (`finished` is False, e.g. the generator
+    was closed early), the rest of the query is cancelled instead of read.
+    """
+    if finished:
+        cursor.close()
+    else:
+        get_backend().cancel(connection, cursor)
+
+# --- Row Formats ---
+# The user_data columns, in the order every streaming query selects them
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# --- Schema Version ---
+# The layout of the live user_data table, read once per process
+_schema_version = None
+_schema_lock = threading.Lock()
+
+def schema_version(refresh=False):
+    """
+    Returns the layout of the live user_data table: 2 when user_id is
+    stored as BINARY(16), 1 otherwise, or DB_SCHEMA_VERSION while there
+    is no table yet. Every query built by this module follows it.
+
+    It is read from information_schema the first time it is needed and
+    then remembered. create_table, migrate_to_v2 and a failed insert_data
+    read it again; other processes that were already running when the
+    tables were swapped keep the old layout until they are restarted or
+    call schema_version(refresh=True).
+    """
+    global _schema_version
+    if _schema_version is not None and not refresh:
+        return _schema_version
+    if get_backend().name != 'mysql':
+        # Version 2 is only ever created on MySQL
+        return 1
+    with _schema_lock:
+        if _schema_version is None or refresh:
+            connection = open_prodev_connection()
+            try:
+                cursor = connection.cursor()
+                version = _read_schema_version(cursor)
+                cursor.close()
+            finally:
+                connection.close()
+            if version is None:
+                # Nothing to detect yet, and nothing to remember either
+                return DB_SCHEMA_VERSION
+            _schema_version = version
+        return _schema_version
+
+def _read_schema_version(cursor):
+    """The layout of user_data as the server sees it now, None without a table."""
+    cursor.execute("SELECT DATA_TYPE FROM information_schema.COLUMNS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data' "
+                   "AND COLUMN_NAME = 'user_id'")
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return 2 if row[0].lower() == 'binary' else 1
+
+def _check_schema_version(cursor):
+    """
+    Fails the current transaction if user_data was swapped for the version
+    2 layout while this process still writes version 1 rows. MySQL would
+    otherwise truncate the UUID text into BINARY(16) with a mere warning
+    under INSERT IGNORE.
+
+    Called after a batch was sent and before it is committed: the batch
+    holds a lock on the table it went into, so the tables cannot be
+    swapped between the check and the commit.
+    """
+    if get_backend().name != 'mysql' or schema_version() >= 2:
+        return
+    if _read_schema_version(cursor) == 2:
+        raise SchemaError("user_data was migrated to schema version 2, "
+                          "the batch written in the version 1 layout is rolled back")
+
+def _recheck_schema_version():
+    """
+    Reads the layout again after a failed write, which may have been sent
+    in the old layout after migrate_to_v2 ran elsewhere, so that resuming
+    uses the live one.
+    """
+    try:
+        schema_version(refresh=True)
+    except Error:
+        pass
+
+def user_id_sql(expression='user_id'):
+    """
+    Wraps an SQL expression reading user_id so it yields the UUID text on
+    every schema version (version 2 stores it as BINARY(16)).
+    """
+    return f"BIN_TO_UUID({expression})" if schema_version() >= 2 else expression
+
+def user_id_param():
+    """The placeholder to compare or store a UUID text parameter as a user_id."""
+    return "UUID_TO_BIN(%s)" if schema_version() >= 2 else "%s"
+
+def select_column(column):
+    """The select-list entry for one of USER_COLUMNS."""
+    if column == 'user_id' and schema_version() >= 2:
+        return f"{user_id_sql()} AS user_id"
+    return column
+
+def select_users():
+    """
+    Selects every user column in USER_COLUMNS order, on any schema version.
+    Refer to the key as user_data.user_id in ORDER BY so MySQL sorts by the
+    indexed column and not by the converted alias.
+    """
+    return f"SELECT {', '.join(select_column(c) for c in USER_COLUMNS)} FROM user_data"
+
+def new_user_id(version=None):
+    """
+    Returns a new user_id for schema `version` (the live one by default).
+    Version 2 uses time-ordered UUIDs (UUIDv7 layout: 48 bits of
+    milliseconds, then random bits), so new rows land at the end of the
+    clustered index instead of splitting random pages.
+    """
+    version = schema_version() if version is None else version
+    if version < 2:
+        return str(uuid.uuid4())
+    value = (time.time_ns() // 1000000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | 0x7 << 76   # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62   # RFC 4122 variant
+    return str(uuid.UUID(int=value))
+
+# A compact, immutable row for the 'namedtuple' row format
+UserRow = namedtuple('UserRow', USER_COLUMNS)
+
+# Formats a single row can be yielded in. 'dict' is the historical default.
+ROW_FORMATS = ('dict', 'tuple', 'namedtuple')
+
+# Batch generators can also hand over a whole batch column by column
+BATCH_FORMATS = ROW_FORMATS + ('columns',)
+
+@lru_cache(maxsize=None)
+def _row_type(columns):
+    """The namedtuple type for rows made of `columns`."""
+    return UserRow if columns == USER_COLUMNS else namedtuple('UserRow', columns)
+
+def row_converter(row_format='dict', columns=USER_COLUMNS):
+    """
+    Returns a function turning a raw row of `columns` (all of USER_COLUMNS
+    by default) from a plain cursor into `row_format`, with the Decimal
+    age converted to int.
+    """
+    columns = tuple(columns)
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Unknown row format '{row_format}', choose one of {ROW_FORMATS}")
+    if columns == USER_COLUMNS:
+        # The common case, spelled out because it runs once per row
+        if row_format == 'dict':
+            return lambda row: {'user_id': row[0], 'name': row[1], 'email': row[2], 'age': int(row[3])}
+        if row_format == 'tuple':
+            return lambda row: (row[0], row[1], row[2], int(row[3]))
+        return lambda row: UserRow(row[0], row[1], row[2], int(row[3]))
+
+    age_at = columns.index('age') if 'age' in columns else None
+
+    def values(row):
+        if age_at is None:
+            return row
+        return row[:age_at] + (int(row[age_at]),) + row[age_at + 1:]
+
+    if row_format == 'dict':
+        return lambda row: dict(zip(columns, values(row)))
+    if row_format == 'tuple':
+        return values
+    row_type = _row_type(columns)
+    return lambda row: row_type(*values(row))
+
+def rows_to_columns(rows, columns=USER_COLUMNS):
+    """
+    Turns a list of raw rows into one sequence per column. Ages are packed
+    into an array('H'), which takes 2 bytes per user instead of an int object.
+    """
+    batch = {}
+    for i, column in enumerate(columns):
+        if column == 'age':
+            batch[column] = array('H', [int(row[i]) for row in rows])
+        else:
+            batch[column] = [row[i] for row in rows]
+    return batch
+
+def batch_converter(row_format='dict', columns=USER_COLUMNS):
+    """Returns a function turning a list of raw rows into a batch in `row_format`."""
+    if row_format == 'columns':
+        columns = tuple(columns)
+        return lambda rows: rows_to_columns(rows, columns)
+    convert = row_converter(row_format, columns)
+    return lambda rows: [convert(row) for row in rows]
+
+# --- Filter Pushdown ---
+# Comparison operators a filter spec may use, with their SQL spelling
+_SQL_COMPARISONS = {'=': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+class UserQuery:
+    """
+    A user_data query compiled from a declarative filter/projection spec.
+
+    `filters` is a list of conditions that must all hold. A condition is
+    either a (column, op, value) tuple or a callable:
+
+    - tuples use a comparison operator ('=', '!=', '<', '<=', '>', '>='),
+      'in' with a list of values, 'between' with a (low, high) pair, or
+      'startswith' with a string. They are compiled into a parameterized
+      WHERE clause, so the server filters the rows (on an index when there is
+      one) and the rejected rows never cross the wire.
+    - callables cannot be translated to SQL. They are called with each
+      row MySQL returns, as a dict with an int age, and the row is
+      dropped unless they return True.
+
+    `columns` picks which of USER_COLUMNS to select, all of them by default,
+    and `limit` caps how many rows are returned. The LIMIT goes into the SQL
+    unless callables have to see the rows first.
+
+    Attributes:
+        sql (str): The SELECT statement to execute.
+        params (list): Its parameters.
+        columns (tuple): The columns of the rows apply() returns.
+    """
+
+    def __init__(self, filters=None, columns=None, limit=None):
+        self.columns = tuple(columns) if columns else USER_COLUMNS
+        conditions, self.params, self._checks = [], [], []
+        for condition in filters or ():
+            if callable(condition):
+                self._checks.append(condition)
+                continue
+            column, op, value = condition
+            if column not in USER_COLUMNS:
+                raise ValueError(f"Cannot filter on '{column}', choose one of {USER_COLUMNS}")
+            placeholder = user_id_param() if column == 'user_id' else "%s"
+            if op in _SQL_COMPARISONS:
+                conditions.append(f"{column} {_SQL_COMPARISONS[op]} {placeholder}")
+                self.params.append(value)
+            elif op == 'in':
+                value = list(value)
+                # An empty IN () is a syntax error; nothing can match it anyway
+                conditions.append(f"{column} IN ({', '.join([placeholder] * len(value))})" if value else "FALSE")
+                self.params.extend(value)
+            elif op == 'between':
+                conditions.append(f"{column} BETWEEN {placeholder} AND {placeholder}")
+                self.params.extend(value)
+            elif op == 'startswith':
+                # '!' rather than a backslash escapes the wildcards, as
+                # backslashes are read differently by each server
+                conditions.append(f"{user_id_sql() if column == 'user_id' else column} LIKE %s ESCAPE '!'")
+                escaped = value.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+                self.params.append(escaped + '%')
+            else:
+                raise ValueError(f"Unknown filter operator '{op}'")
+        for column in self.columns:
+            if column not in USER_COLUMNS:
+                raise ValueError(f"Unknown column '{column}', choose from {USER_COLUMNS}")
+
+        # Python-side checks may look at any column, so they need full rows
+        self._fetched = USER_COLUMNS if self._checks else self.columns
+        self.sql = f"SELECT {', '.join(select_column(c) for c in self._fetched)} FROM user_data"
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        self.limit = None if limit is None else int(limit)
+        if self.limit is not None and not self._checks:
+            self.sql += " LIMIT %s"
+            self.params.append(self.limit)
+
+    @property
+    def needs_python(self):
+        """True when some filters could not be pushed down to MySQL."""
+        return bool(self._checks)
+
+    def apply(self, rows):
+        """
+        Runs the filters that could not be pushed down over an iterable of
+        raw rows and trims the survivors to `columns`. Returns `rows`
+        itself when there is nothing left to do, otherwise an iterator.
+        """
+        if not self._checks:
+            return rows
+        as_dict = row_converter('dict')
+        kept = (row for row in rows if all(check(as_dict(row)) for check in self._checks))
+        if self.limit is not None:
+            kept = islice(kept, self.limit)
+        if self.columns == USER_COLUMNS:
+            return kept
+        positions = [USER_COLUMNS.index(column) for column in self.columns]
+        return (tuple(row[i] for i in positions) for row in kept)
+
+def user_table_ddl(version=None, table='user_data'):
+    """
+    Returns the CREATE TABLE statement for a user_data layout.
+
+    Version 1 keys rows by a VARCHAR(36) UUID. Version 2 keys them by a
+    BINARY(16) UUID, which is less than half the size and is repeated in
+    every secondary index, and adds an index on age; it needs MySQL.
+    """
+    version = DB_SCHEMA_VERSION if version is None else version
+    options = get_backend().table_options
+    if version >= 2:
+        if get_backend().name != 'mysql':
+            raise ValueError("Schema version 2 is only available on MySQL")
+        return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        user_id BINARY(16) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        age DECIMAL(3, 0) NOT NULL,
+        UNIQUE(email),
+        INDEX idx_{table}_age (age)
+    ){options};
+    """
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
         user_id VARCHAR(36) PRIMARY KEY,
         name VARCHAR(255) NOT NULL,
         email VARCHAR(255) NOT NULL,
         age DECIMAL(3, 0) NOT NULL,
         UNIQUE(email)
-    ) ENGINE=InnoDB;
+    ){options};
     """
+
+def create_table(connection):
+    """Creates a table user_data if it does not exist with the required fields."""
+    cursor = connection.cursor()
+    create_table_query = user_table_ddl()
     try:
         cursor.execute(create_table_query)
         print("Table 'user_data' created or already exists.")
     except Error as e:
         print(f"Error creating table: {e}")
+        return
     finally:
         cursor.close()
+    # The table may have existed already, with either layout
+    schema_version(refresh=True)
+    create_stats_tables(connection)
 
-def insert_data(connection, csv_filename):
+# --- Schema Migration ---
+# Triggers that copy writes made to user_data into user_data_v2 while
+# migrate_to_v2 is backfilling it, so the table can stay online.
+_MIRROR_TRIGGERS = {
+    'user_data_mirror_insert': """
+    CREATE TRIGGER user_data_mirror_insert AFTER INSERT ON user_data FOR EACH ROW
+        REPLACE INTO user_data_v2 (user_id, name, email, age)
+        VALUES (UUID_TO_BIN(NEW.user_id), NEW.name, NEW.email, NEW.age)
+    """,
+    'user_data_mirror_update': """
+    CREATE TRIGGER user_data_mirror_update AFTER UPDATE ON user_data FOR EACH ROW
+        REPLACE INTO user_data_v2 (user_id, name, email, age)
+        VALUES (UUID_TO_BIN(NEW.user_id), NEW.name, NEW.email, NEW.age)
+    """,
+    'user_data_mirror_delete': """
+    CREATE TRIGGER user_data_mirror_delete AFTER DELETE ON user_data FOR EACH ROW
+        DELETE FROM user_data_v2 WHERE user_id = UUID_TO_BIN(OLD.user_id)
+    """,
+}
+
+def migrate_to_v2(connection, batch_size=10000):
     """
-    Reads data from a CSV file and inserts it into the user_data table.
-    It ignores rows with duplicate emails to prevent errors on re-runs.
+    Moves user_data from the version 1 layout to version 2.
+
+    The rows are copied into a new user_data_v2 table in primary key order,
+    one committed batch at a time, while triggers replay concurrent writes
+    on the new table, so user_data stays in use while it is copied. The
+    two tables are then swapped with a single atomic RENAME and the old
+    one is kept as user_data_v1. Existing user_ids keep their values (only
+    their storage changes) and rows inserted afterwards get time-ordered
+    ids.
+
+    The swap itself needs downtime: this process switches to the new
+    layout at once, but other running processes keep the version 1 SQL
+    (see schema_version) and would read user_ids as raw bytes. Stop them
+    before the copy ends and start them again afterwards. A version 1
+    writer that was not stopped fails its next batch with SchemaError
+    instead of storing truncated ids.
+
+    Returns:
+        bool: True if the tables were swapped.
     """
-    # Read and prepare data from CSV
-    data_to_insert = []
+    if get_backend().name != 'mysql':
+        print("Error migrating user_data: schema version 2 is only available on MySQL.")
+        return False
+    cursor = connection.cursor()
     try:
-        with open(csv_filename, mode='r', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header row
-            for row in reader:
-                # Each row is (name, email, age)
-                # We add a UUID for the user_id
-                data_to_insert.append((str(uuid.uuid4()), row[0], row[1], int(row[2])))
-    except FileNotFoundError:
-        print(f"Error: The file '{csv_filename}' was not found.")
+        cursor.execute(user_table_ddl(2, 'user_data_v2'))
+        for name, query in _MIRROR_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(query)
+
+        copied = 0
+        last_key = ''
+        while True:
+            # Find where this batch ends, then copy up to and including it
+            cursor.execute(
+                "SELECT user_id FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT 1 OFFSET %s",
+                (last_key, batch_size - 1)
+            )
+            end = cursor.fetchone()
+            condition = "user_id > %s" + (" AND user_id <= %s" if end else "")
+            cursor.execute(
+                "INSERT IGNORE INTO user_data_v2 (user_id, name, email, age) "
+                "SELECT UUID_TO_BIN(user_id), name, email, age FROM user_data WHERE " + condition,
+                (last_key, end[0]) if end else (last_key,)
+            )
+            connection.commit()
+            copied += cursor.rowcount
+            print(f"{copied} rows copied to 'user_data_v2'.")
+            if not end:
+                break
+            last_key = end[0]
+
+        cursor.execute("RENAME TABLE user_data TO user_data_v1, user_data_v2 TO user_data")
+        print("Swapped in the version 2 layout, the old table is kept as 'user_data_v1'.")
+        # The mirror triggers moved with the old table and are not needed any more
+        for name in _MIRROR_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    except Error as e:
+        print(f"Error migrating user_data: {e}")
+        print("Run migrate_to_v2 again to resume; writes are still mirrored to 'user_data_v2'.")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+
+    schema_version(refresh=True)
+    # The statistics triggers also stayed on the old table
+    create_stats_tables(connection)
+    print("Start the other processes using 'user_data' again, "
+          "then drop 'user_data_v1' once you are satisfied.")
+    print("Set DB_SCHEMA_VERSION=2 so new databases get the same layout.")
+    return True
+
+# --- Running User Statistics ---
+# user_stats holds a single row with the number of users and the sum of
+# their ages; user_age_histogram holds the number of users of each age.
+# Triggers on user_data keep both current inside the transaction that
+# changes user_data, whichever way the rows are written. They are only
+# maintained on MySQL; elsewhere aggregates are computed from user_data.
+#
+# Every insert updates the one user_stats row, which stays locked until
+# the transaction commits. Sessions that insert in parallel set
+# @user_stats_deferred, so the insert trigger leaves the statistics alone,
+# and add each batch's totals in one go right before committing (see
+# _add_user_stats).
+_STATS_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        id TINYINT PRIMARY KEY,
+        user_count BIGINT NOT NULL,
+        age_sum BIGINT NOT NULL
+    ) ENGINE=InnoDB;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_age_histogram (
+        age SMALLINT PRIMARY KEY,
+        user_count BIGINT NOT NULL
+    ) ENGINE=InnoDB;
+    """,
+]
+
+_STATS_TRIGGERS = {
+    'user_data_stats_insert': """
+    CREATE TRIGGER user_data_stats_insert AFTER INSERT ON user_data FOR EACH ROW
+    BEGIN
+        IF @user_stats_deferred IS NULL THEN
+            UPDATE user_stats SET user_count = user_count + 1, age_sum = age_sum + NEW.age WHERE id = 1;
+            INSERT INTO user_age_histogram (age, user_count) VALUES (NEW.age, 1)
+                ON DUPLICATE KEY UPDATE user_count = user_count + 1;
+        END IF;
+    END
+    """,
+    'user_data_stats_delete': """
+    CREATE TRIGGER user_data_stats_delete AFTER DELETE ON user_data FOR EACH ROW
+    BEGIN
+        UPDATE user_stats SET user_count = user_count - 1, age_sum = age_sum - OLD.age WHERE id = 1;
+        UPDATE user_age_histogram SET user_count = user_count - 1 WHERE age = OLD.age;
+    END
+    """,
+    'user_data_stats_update': """
+    CREATE TRIGGER user_data_stats_update AFTER UPDATE ON user_data FOR EACH ROW
+    BEGIN
+        IF NEW.age <> OLD.age THEN
+            UPDATE user_stats SET age_sum = age_sum - OLD.age + NEW.age WHERE id = 1;
+            UPDATE user_age_histogram SET user_count = user_count - 1 WHERE age = OLD.age;
+            INSERT INTO user_age_histogram (age, user_count) VALUES (NEW.age, 1)
+                ON DUPLICATE KEY UPDATE user_count = user_count + 1;
+        END IF;
+    END
+    """,
+}
+
+def create_stats_tables(connection):
+    """
+    Creates the running statistics tables and the triggers that maintain
+    them, then fills them from the rows already in user_data.
+
+    Either all of it succeeds or the tables and triggers are dropped
+    again: tables nobody keeps current would be read as the truth, while
+    without them readers fall back to scanning user_data.
+    """
+    if not get_backend().maintains_stats:
+        print(f"User statistics are not maintained on {get_backend().name}.")
         return
-    except Exception as e:
-        print(f"An error occurred while reading the CSV file: {e}")
+    cursor = connection.cursor()
+    try:
+        for query in _STATS_TABLES:
+            cursor.execute(query)
+        for name, query in _STATS_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(query)
+        print("Tables 'user_stats' and 'user_age_histogram' created or already exist.")
+    except Error as e:
+        print(f"Error creating statistics tables: {e}")
+        _drop_stats_tables(connection)
         return
+    finally:
+        cursor.close()
+    if not rebuild_user_stats(connection):
+        _drop_stats_tables(connection)
 
-    if not data_to_insert:
-        print("No data to insert.")
+def _drop_stats_tables(connection):
+    """Removes the statistics triggers and tables after a failed setup."""
+    cursor = connection.cursor()
+    try:
+        # The triggers first, so no insert fails on a missing table
+        for name in _STATS_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute("DROP TABLE IF EXISTS user_stats")
+        cursor.execute("DROP TABLE IF EXISTS user_age_histogram")
+        connection.commit()
+        print("Dropped the statistics tables, averages will be computed from 'user_data'.")
+    except Error as e:
+        print(f"Error dropping statistics tables: {e}")
+    finally:
+        cursor.close()
+
+def _stats_triggers_deferrable(cursor):
+    """True if the installed insert trigger honours @user_stats_deferred."""
+    cursor.execute("SELECT ACTION_STATEMENT FROM information_schema.TRIGGERS "
+                   "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = 'user_data_stats_insert'")
+    row = cursor.fetchone()
+    return row is not None and '@user_stats_deferred' in row[0]
+
+def _add_user_stats(cursor, user_ids, max_params):
+    """
+    Adds the users of `user_ids` that were actually inserted (duplicates
+    were ignored) to the statistics tables, in the current transaction.
+    For sessions with @user_stats_deferred set, once per batch. The ids
+    are looked up at most `max_params` at a time.
+    """
+    histogram = {}
+    step = max(1, min(1000, max_params))
+    for start in range(0, len(user_ids), step):
+        part = user_ids[start:start + step]
+        cursor.execute(f"SELECT age, COUNT(*) FROM user_data WHERE user_id IN "
+                       f"({', '.join([user_id_param()] * len(part))}) GROUP BY age", part)
+        for age, users in cursor.fetchall():
+            histogram[int(age)] = histogram.get(int(age), 0) + int(users)
+    if not histogram:
         return
+    # Rows are locked in the same order (ages ascending, then user_stats) by
+    # every session, so concurrent batches cannot deadlock on them.
+    ages = sorted(histogram.items())
+    cursor.execute(
+        "INSERT INTO user_age_histogram (age, user_count) VALUES "
+        + ", ".join(["(%s, %s)"] * len(ages))
+        + " ON DUPLICATE KEY UPDATE user_count = user_count + VALUES(user_count)",
+        [value for item in ages for value in item]
+    )
+    cursor.execute("UPDATE user_stats SET user_count = user_count + %s, age_sum = age_sum + %s "
+                   "WHERE id = 1",
+                   (sum(histogram.values()), sum(age * users for age, users in ages)))
+
+def _recount_user_stats(cursor):
+    """Computes the statistics from scratch with a scan of user_data."""
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(age), 0) FROM user_data")
+    count, total = cursor.fetchone()
+    cursor.execute("SELECT age, COUNT(*) FROM user_data GROUP BY age")
+    histogram = {int(age): users for age, users in cursor.fetchall()}
+    return int(count), int(total), histogram
+
+def rebuild_user_stats(connection):
+    """
+    Recomputes the statistics tables from user_data. Writers are held off
+    with table locks for the duration so no insert is counted twice.
 
-    # Use INSERT IGNORE to skip inserting rows that would cause a duplicate entry
-    # for the 'email' unique key.
-    insert_query = """
-    INSERT IGNORE INTO user_data (user_id, name, email, age)
-    VALUES (%s, %s, %s, %s)
+    Returns:
+        bool: True if the tables were rebuilt.
     """
     cursor = connection.cursor()
     try:
-        cursor.executemany(insert_query, data_to_insert)
-        connection.commit()
-        print(f"{cursor.rowcount} new rows were inserted into 'user_data'.")
+        cursor.execute("LOCK TABLES user_data READ, user_stats WRITE, user_age_histogram WRITE")
+        try:
+            count, total, histogram = _recount_user_stats(cursor)
+            cursor.execute("REPLACE INTO user_stats (id, user_count, age_sum) VALUES (1, %s, %s)",
+                           (count, total))
+            cursor.execute("DELETE FROM user_age_histogram")
+            if histogram:
+                cursor.executemany("INSERT INTO user_age_histogram (age, user_count) VALUES (%s, %s)",
+                                   list(histogram.items()))
+            connection.commit()
+        finally:
+            cursor.execute("UNLOCK TABLES")
+    except Error as e:
+        print(f"Error rebuilding user statistics: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+    return True
+
+def get_user_stats(connection):
+    """
+    Reads the running statistics without scanning user_data.
+
+    Returns:
+        dict: 'count', 'age_sum' and 'average' (None when there are no
+        users), or None if the statistics tables are missing.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT user_count, age_sum FROM user_stats WHERE id = 1")
+        row = cursor.fetchone()
+    except Error as e:
+        print(f"Error reading user statistics: {e}")
+        return None
+    finally:
+        cursor.close()
+    count, total = (int(row[0]), int(row[1])) if row else (0, 0)
+    return {'count': count, 'age_sum': total, 'average': total / count if count else None}
+
+def get_average_age(connection):
+    """Returns the average user age from the running statistics, or None."""
+    stats = get_user_stats(connection)
+    return stats and stats['average']
+
+def check_user_stats(connection, repair=False):
+    """
+    Recomputes the statistics with a full scan and compares them with the
+    maintained tables.
+
+    Returns:
+        list: A description of every difference found; empty when the
+        tables are consistent. With repair=True inconsistent tables are
+        rebuilt afterwards.
+    """
+    cursor = connection.cursor()
+    try:
+        count, total, histogram = _recount_user_stats(cursor)
+        cursor.execute("SELECT user_count, age_sum FROM user_stats WHERE id = 1")
+        stored = cursor.fetchone() or (0, 0)
+        cursor.execute("SELECT age, user_count FROM user_age_histogram WHERE user_count <> 0")
+        stored_histogram = {int(age): int(users) for age, users in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    problems = []
+    if int(stored[0]) != count:
+        problems.append(f"user_count is {stored[0]}, expected {count}")
+    if int(stored[1]) != total:
+        problems.append(f"age_sum is {stored[1]}, expected {total}")
+    for age in sorted(set(histogram) | set(stored_histogram)):
+        if histogram.get(age, 0) != stored_histogram.get(age, 0):
+            problems.append(f"age {age} has {stored_histogram.get(age, 0)} users, "
+                            f"expected {histogram.get(age, 0)}")
+    if problems and repair:
+        rebuild_user_stats(connection)
+    return problems
+
+# What insert_data did: rows read from the CSV, rows inserted, rows skipped
+# as duplicate emails, the byte offset to resume from on a later run, and
+# with dedup on, why rows were skipped (see dedup.DedupStage.counts).
+InsertReport = namedtuple('InsertReport', ['read', 'inserted', 'skipped', 'offset', 'duplicates'],
+                          defaults=(None,))
+
+
+class _CountingLines:
+    """
+    Feeds a binary file to csv.reader line by line while counting how many
+    bytes have been consumed. csv.reader only pulls the lines it needs for
+    the next record, so after every row `offset` is exactly the position
+    where the following row starts.
+    """
+
+    def __init__(self, binary_file, offset=0):
+        self._file = binary_file
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self._file:
+            self.offset += len(line)
+            yield line.decode('utf-8')
+
+
+def read_csv_chunks(csv_filename, chunk_size=1000, start_offset=0, with_ids=True):
+    """
+    A generator that reads the users CSV in chunks of `chunk_size` rows.
+
+    Only one chunk is held in memory at a time. The header row is skipped
+    when reading from the start of the file.
+
+    Yields:
+        tuple: (rows, offset) where rows is a list of (user_id, name, email,
+        age) tuples, or (name, email, age) tuples when with_ids is False,
+        and offset is the byte position right after the chunk.
+    """
+    with open(csv_filename, mode='rb') as csvfile:
+        csvfile.seek(start_offset)
+        lines = _CountingLines(csvfile, start_offset)
+        reader = csv.reader(lines)
+        if start_offset == 0:
+            next(reader, None)  # Skip header row
+
+        chunk = []
+        for row in reader:
+            # Each row is (name, email, age)
+            # We add a UUID for the user_id
+            if with_ids:
+                chunk.append((new_user_id(), row[0], row[1], int(row[2])))
+            else:
+                chunk.append((row[0], row[1], int(row[2])))
+            if len(chunk) >= chunk_size:
+                yield chunk, lines.offset
+                chunk = []
+        if chunk:
+            yield chunk, lines.offset
+
+
+# Ways insert_data can send a batch, fastest first. Each backend supports
+# some of them (see Backend.ingest_strategies); load_data needs MySQL.
+INGEST_STRATEGIES = ('load_data', 'multi_values', 'executemany')
+
+def insert_users_query(rows=1):
+    """
+    An INSERT of `rows` (user_id, name, email, age) rows into user_data
+    that skips users whose email is already there.
+    """
+    row = f"({user_id_param()}, %s, %s, %s)"
+    return get_backend().insert_ignore("user_data", "user_id, name, email, age",
+                                       ", ".join([row] * rows))
+
+
+def _insert_executemany(cursor, rows, max_packet, max_params):
+    """Sends the batch through executemany."""
+    cursor.executemany(insert_users_query(), rows)
+    return cursor.rowcount
+
+
+def _insert_multi_values(cursor, rows, max_packet, max_params):
+    """
+    Sends the batch as multi-row INSERT statements, each kept under
+    `max_packet` bytes and `max_params` parameters.
+    """
+    inserted = 0
+    statement_rows = []
+    max_rows = max_params // len(USER_COLUMNS)
+    size = len(insert_users_query(0))
+    for row in rows:
+        # Worst case every character of name and email needs escaping
+        row_size = 2 * (len(row[1].encode('utf-8')) + len(row[2].encode('utf-8'))) + 64
+        if statement_rows and (size + row_size > max_packet or len(statement_rows) >= max_rows):
+            inserted += _execute_multi_row_insert(cursor, statement_rows)
+            statement_rows = []
+            size = len(insert_users_query(0))
+        statement_rows.append(row)
+        size += row_size
+    if statement_rows:
+        inserted += _execute_multi_row_insert(cursor, statement_rows)
+    return inserted
+
+
+def _execute_multi_row_insert(cursor, rows):
+    cursor.execute(insert_users_query(len(rows)), [value for row in rows for value in row])
+    return cursor.rowcount
+
+
+def _escape_infile_field(value):
+    """Escapes a value for LOAD DATA's default tab-separated format."""
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _insert_load_data(cursor, rows, max_packet, max_params):
+    """Writes the batch to a temporary file and bulk loads it with LOAD DATA LOCAL INFILE."""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv') as infile:
+        for row in rows:
+            infile.write('\t'.join(_escape_infile_field(value) for value in row))
+            infile.write('\n')
+        infile.flush()
+        # IGNORE keeps the INSERT IGNORE behaviour for duplicate emails.
+        # The file holds UUID text, which schema version 2 converts while loading.
+        columns = ("(@user_id, name, email, age) SET user_id = UUID_TO_BIN(@user_id)"
+                   if schema_version() >= 2 else "(user_id, name, email, age)")
+        cursor.execute(
+            "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data "
+            "CHARACTER SET utf8mb4 " + columns,
+            (infile.name,)
+        )
+    return cursor.rowcount
+
+
+_INGESTERS = {
+    'load_data': _insert_load_data,
+    'multi_values': _insert_multi_values,
+    'executemany': _insert_executemany,
+}
+
+
+def _send_rows(cursor, rows, current, strategy, max_packet, max_params):
+    """
+    Inserts `rows` with the `current` strategy. When `strategy` is 'auto',
+    a refused LOAD DATA switches to multi-row INSERTs. Raises SchemaError,
+    leaving the rows to be rolled back, if they were written in a layout
+    user_data no longer has.
+
+    `max_packet` and `max_params` bound a single statement (see
+    Backend.max_statement_size and Backend.max_params). They are looked up
+    once per connection by the caller, as not every driver's cursor can
+    lead back to its connection.
+
+    Returns:
+        tuple: (rows inserted, the strategy to use from now on)
+    """
+    try:
+        inserted = _INGESTERS[current](cursor, rows, max_packet, max_params)
+    except Error as e:
+        if strategy != 'auto' or current != 'load_data' or not get_backend().local_infile_refused(e):
+            raise
+        current = 'multi_values'
+        inserted = _INGESTERS[current](cursor, rows, max_packet, max_params)
+    _check_schema_version(cursor)
+    return inserted, current
+
+
+def insert_data(connection, csv_filename, batch_size=1000, start_offset=0, progress=True,
+                strategy='auto', dedup=None):
+    """
+    Reads data from a CSV file and inserts it into the user_data table.
+    It ignores rows with duplicate emails to prevent errors on re-runs.
+
+    The file is streamed `batch_size` rows at a time and every batch is
+    committed on its own, so memory use stays flat however large the file
+    is. If a batch fails it is rolled back and the returned report's
+    `offset` points right after the last committed batch; passing it back
+    as `start_offset` resumes the load from there.
+
+    `strategy` picks how each batch is sent, one of the backend's
+    INGEST_STRATEGIES. The default 'auto' uses the fastest one; on MySQL
+    that is LOAD DATA LOCAL INFILE, falling back to multi-row INSERTs when
+    local infile is disabled on the client (DB_ALLOW_LOCAL_INFILE) or the
+    server.
+
+    On MySQL the user_data triggers update user_stats and
+    user_age_histogram for every inserted row, inside the same per-batch
+    transaction. Callbacks registered with on_user_data_change run after
+    every batch that added users.
+
+    With `dedup` set to one of dedup.DEDUP_MODES, the emails already in
+    user_data are loaded once into a hash set ('set') or a Bloom filter
+    ('bloom'; 'auto' picks by table size), and rows that are already
+    stored or repeated in the file are dropped before they are sent. The
+    report's `duplicates` then counts the rows dropped for each reason.
+
+    Returns:
+        InsertReport: What was read, inserted and skipped, or None if the
+        file could not be opened.
+    """
+    backend = get_backend()
+    if strategy != 'auto' and strategy not in backend.ingest_strategies:
+        raise ValueError(f"Unknown strategy '{strategy}' for {backend.name}, "
+                         f"choose 'auto' or one of {backend.ingest_strategies}")
+    read = inserted = 0
+    offset = start_offset
+    started = last_report = time.monotonic()
+
+    stage = None
+    cursor = connection.cursor()
+    try:
+        max_packet = backend.max_statement_size(cursor)
+        max_params = backend.max_params(connection)
+        if dedup:
+            # Roughly 40 bytes per CSV line, to size the filter of new emails
+            stage = DedupStage(connection, dedup, os.path.getsize(csv_filename) // 40)
+
+        current = backend.ingest_strategies[0] if strategy == 'auto' else strategy
+        for chunk, chunk_end in read_csv_chunks(csv_filename, batch_size, start_offset,
+                                                with_ids=stage is None):
+            if stage is None:
+                rows = chunk
+            else:
+                # Only the users that survive get an id
+                rows = [(new_user_id(),) + row for row in stage.filter(cursor, chunk)]
+            chunk_inserted = 0
+            if rows:
+                chunk_inserted, current = _send_rows(cursor, rows, current, strategy,
+                                                     max_packet, max_params)
+            connection.commit()
+            if stage is not None:
+                stage.added(rows)
+            if chunk_inserted:
+                _notify_user_data_change()
+            read += len(chunk)
+            inserted += chunk_inserted
+            offset = chunk_end
+
+            now = time.monotonic()
+            if progress and now - last_report >= 1:
+                rate = read / (now - started)
+                print(f"{read} rows read, {inserted} inserted ({rate:.0f} rows/sec, {current})")
+                last_report = now
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_filename}' was not found.")
+        return None
     except Error as e:
         print(f"Error inserting data: {e}")
         connection.rollback()
+        _recheck_schema_version()
+        print(f"Resume with start_offset={offset}.")
+    except (csv.Error, UnicodeDecodeError, ValueError, IndexError) as e:
+        # A malformed line: a missing field or an age that is not a number
+        print(f"An error occurred while reading the CSV file: {e}")
+        connection.rollback()
+        print(f"Resume with start_offset={offset}.")
+    finally:
+        cursor.close()
+
+    if read == 0:
+        print("No data to insert.")
+    else:
+        print(f"{inserted} new rows were inserted into 'user_data', "
+              f"{read - inserted} duplicates skipped.")
+    duplicates = None
+    if stage is not None:
+        duplicates = stage.counts()
+        # Sent but ignored by the server, e.g. inserted meanwhile by someone else
+        duplicates['rejected'] = read - inserted - duplicates['existing'] - duplicates['in_file']
+        if read:
+            print(f"{duplicates['existing']} were already stored, {duplicates['in_file']} repeated "
+                  f"in the file, {duplicates['rejected']} rejected by the database.")
+    return InsertReport(read, inserted, read - inserted, offset, duplicates)
+
+
+# --- Parallel Ingest ---
+# How much of the CSV a parser process handles at a time
+CSV_RANGE_BYTES = 4 * 1024 * 1024
+
+def csv_byte_ranges(csv_filename, range_bytes=CSV_RANGE_BYTES, start_offset=0):
+    """
+    Splits a CSV file into (start, end) byte ranges of about `range_bytes`
+    that begin and end on line boundaries, skipping the header row when
+    starting from the beginning. Records must not contain line breaks.
+    """
+    size = os.path.getsize(csv_filename)
+    with open(csv_filename, mode='rb') as csvfile:
+        if start_offset == 0:
+            csvfile.readline()  # Skip header row
+            start = csvfile.tell()
+        else:
+            start = start_offset
+        while start < size:
+            target = start + range_bytes
+            if target >= size:
+                end = size
+            else:
+                # Finish the line the target falls in
+                csvfile.seek(target - 1)
+                csvfile.readline()
+                end = csvfile.tell()
+            yield start, end
+            start = end
+
+def _parse_csv_range(csv_filename, start, end):
+    """Parses one byte range of the CSV into (name, email, age) tuples; runs in a worker process."""
+    with open(csv_filename, mode='rb') as csvfile:
+        csvfile.seek(start)
+        lines = csvfile.read(end - start).decode('utf-8').splitlines()
+    return [(row[0], row[1], int(row[2])) for row in csv.reader(lines) if row]
+
+
+class _ParallelLoad:
+    """The state the threads of one insert_data_parallel run share."""
+
+    def __init__(self, ranges):
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+        self.error = None
+        # Rows of committed batches, whether inserted or ignored as duplicates
+        self.read = 0
+        self.inserted = 0
+        # Batches of each range not committed yet; None until all are queued
+        self.pending = [None] * ranges
+
+    def committed(self, range_index, sent, inserted):
+        with self.lock:
+            self.read += sent
+            self.inserted += inserted
+            self.pending[range_index] -= 1
+
+    def fail(self, error):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.failed.set()
+
+
+def _insert_worker(pool, batches, load, strategy):
+    """Inserts the batches of one partition, one transaction each, on a connection of its own."""
+    defer_stats = get_backend().maintains_stats
+    try:
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                max_packet = get_backend().max_statement_size(cursor)
+                max_params = get_backend().max_params(connection)
+                current = get_backend().ingest_strategies[0] if strategy == 'auto' else strategy
+                if defer_stats:
+                    # Per-row trigger updates would hold the user_stats row
+                    # locked for the whole batch and serialize the inserters
+                    cursor.execute("SET @user_stats_deferred = 1")
+                while True:
+                    item = batches.get()
+                    if item is None:
+                        break
+                    if load.failed.is_set():
+                        continue  # Keep draining so the dispatcher never blocks
+                    range_index, rows = item
+                    rows = [(new_user_id(),) + row for row in rows]
+                    inserted, current = _send_rows(cursor, rows, current, strategy,
+                                                   max_packet, max_params)
+                    if defer_stats and inserted:
+                        # Last, so the statistics rows are locked only briefly
+                        _add_user_stats(cursor, [row[0] for row in rows], max_params)
+                    connection.commit()
+                    load.committed(range_index, len(rows), inserted)
+                    if inserted:
+                        _notify_user_data_change()
+            finally:
+                if defer_stats:
+                    cursor.execute("SET @user_stats_deferred = NULL")
+                cursor.close()
+    except Exception as e:
+        load.fail(e)
+        while batches.get() is not None:
+            pass
+
+
+def insert_data_parallel(csv_filename, workers=4, batch_size=1000, start_offset=0, progress=True,
+                         strategy='auto', range_bytes=CSV_RANGE_BYTES):
+    """
+    Loads a users CSV like insert_data, parsing and inserting in parallel.
+
+    The file is cut into byte ranges on line boundaries that `workers`
+    processes parse, while `workers` threads insert on connections of a
+    pool of their own, each committing every batch it sends.
+
+    Every row goes to the inserter chosen by a hash of its email, and each
+    inserter receives its rows in file order. A repeated email therefore
+    always meets its first occurrence on the same connection, so the rows
+    that are kept and all counts are the same as with a sequential load,
+    however the work is scheduled. The order in which users land in the
+    table is not.
+
+    Backends that serialize writers (SQLite) use a single inserter; the
+    parsing still runs in parallel. On MySQL the inserters bypass the
+    per-row statistics triggers, which would make every connection wait
+    for the single user_stats row, and add each batch's totals just before
+    committing it. Tables created before the triggers could be bypassed
+    get them reinstalled (and the statistics rebuilt) first.
+
+    Returns:
+        InsertReport: As for insert_data. `read` and `skipped` count the
+        rows of committed batches only, so after a failure rows that were
+        parsed but never sent are left out. `offset` is the end of the
+        last range committed in full, counted from the start of the file,
+        and can be passed back as `start_offset` after a failure.
+    """
+    backend = get_backend()
+    if strategy != 'auto' and strategy not in backend.ingest_strategies:
+        raise ValueError(f"Unknown strategy '{strategy}' for {backend.name}, "
+                         f"choose 'auto' or one of {backend.ingest_strategies}")
+    try:
+        ranges = list(csv_byte_ranges(csv_filename, range_bytes, start_offset))
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_filename}' was not found.")
+        return None
+
+    if backend.maintains_stats:
+        connection = open_prodev_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                deferrable = _stats_triggers_deferrable(cursor)
+            finally:
+                cursor.close()
+            if not deferrable:
+                create_stats_tables(connection)
+        finally:
+            connection.close()
+
+    inserters = workers if backend.concurrent_writes else 1
+    load = _ParallelLoad(len(ranges))
+    parsed = 0
+    started = last_report = time.monotonic()
+    pool = ConnectionPool(size=inserters, health_check=False)
+    parsers = ProcessPoolExecutor(max_workers=workers)
+    # Ranges are parsed a few ahead of the inserters and taken in file order
+    parsing = deque()
+    next_range = 0
+
+    def parse_ahead():
+        nonlocal next_range
+        while next_range < len(ranges) and len(parsing) < workers * 2:
+            parsing.append(parsers.submit(_parse_csv_range, csv_filename, *ranges[next_range]))
+            next_range += 1
+
+    # The first submit forks the parser processes; do it before starting
+    # any thread so no lock is copied into them held.
+    parse_ahead()
+    partitions = [queue.Queue(maxsize=4) for _ in range(inserters)]
+    threads = [threading.Thread(target=_insert_worker, args=(pool, partition, load, strategy))
+               for partition in partitions]
+    for thread in threads:
+        thread.start()
+    try:
+        for range_index in range(len(ranges)):
+            parse_ahead()
+            rows = parsing.popleft().result()
+            parsed += len(rows)
+
+            split = [[] for _ in range(inserters)]
+            for row in rows:
+                split[hash(email_key(row[1])) % inserters].append(row)
+            batches = [(i, part[start:start + batch_size])
+                       for i, part in enumerate(split) for start in range(0, len(part), batch_size)]
+            with load.lock:
+                load.pending[range_index] = len(batches)
+            for i, batch in batches:
+                if load.failed.is_set():
+                    break
+                partitions[i].put((range_index, batch))
+            if load.failed.is_set():
+                break
+
+            now = time.monotonic()
+            if progress and now - last_report >= 1:
+                print(f"{parsed} rows read, {load.inserted} inserted "
+                      f"({parsed / (now - started):.0f} rows/sec, {inserters} inserters)")
+                last_report = now
+    except Exception as e:
+        load.fail(e)
     finally:
-        cursor.close()
\ No newline at end of file
+        for partition in partitions:
+            partition.put(None)
+        for thread in threads:
+            thread.join()
+        for future in parsing:
+            future.cancel()
+        parsers.shutdown()
+        pool.close()
+
+    # Resume from the end of the longest run of ranges committed in full
+    offset = start_offset
+    for (_, end), pending in zip(ranges, load.pending):
+        if pending != 0:
+            break
+        offset = end
+    if load.error is not None:
+        print(f"Error inserting data: {load.error}")
+        _recheck_schema_version()
+        print(f"Resume with start_offset={offset}.")
+
+    if parsed == 0:
+        print("No data to insert.")
+    else:
+        print(f"{load.inserted} new rows were inserted into 'user_data', "
+              f"{load.read - load.inserted} duplicates skipped.")
+    return InsertReport(load.read, load.inserted, load.read - load.inserted, offset)
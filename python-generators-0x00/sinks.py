@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Output sinks for the batch pipeline.
+
+A sink receives whole batches of users and writes each one with a single
+write and flush, instead of one print() per row. Every sink has the same
+small interface:
+
+    sink.write_batch(batch)   # a list of rows, or a 'columns' batch
+    sink.close()              # flushes and releases what the sink owns
+    sink.closed               # True once the sink cannot take more rows
+
+and can be used as a context manager. Rows may be in any of the row
+formats of seed.ROW_FORMATS.
+
+ParquetSink and FeatherSink need pyarrow; the other sinks do not.
+"""
+import csv
+import io
+import json
+import os
+import queue
+import sys
+import threading
+from array import array
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional, only the Arrow sinks need it
+    pyarrow = None
+
+
+def iter_rows(batch):
+    """Yields the rows of a batch, turning a 'columns' batch back into dicts."""
+    if isinstance(batch, dict):
+        columns = list(batch)
+        for values in zip(*batch.values()):
+            yield dict(zip(columns, values))
+    else:
+        yield from batch
+
+
+def as_dict(row, columns=None):
+    """Turns a dict, namedtuple or plain tuple row into a dict."""
+    if isinstance(row, dict):
+        return row
+    if hasattr(row, '_asdict'):
+        return row._asdict()
+    return dict(zip(columns or ('user_id', 'name', 'email', 'age'), row))
+
+
+class Sink:
+    """Base class for sinks. Subclasses implement write_batch."""
+
+    closed = False
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamSink(Sink):
+    """
+    A sink writing text to a stream or to a file it opens itself.
+
+    A stream that is passed in is flushed but never closed. If the reader
+    goes away (e.g. `| head`), the sink marks itself closed instead of
+    raising BrokenPipeError, so the pipeline can simply stop.
+    """
+
+    def __init__(self, target=None):
+        if target is None:
+            target = sys.stdout
+        self._owned = isinstance(target, (str, os.PathLike))
+        self.stream = open(target, 'w', encoding='utf-8', newline='') if self._owned else target
+
+    def format_batch(self, batch):
+        """Returns the text for a whole batch."""
+        raise NotImplementedError
+
+    def write_batch(self, batch):
+        if self.closed:
+            return
+        try:
+            self.stream.write(self.format_batch(batch))
+            self.stream.flush()
+        except BrokenPipeError:
+            self._reader_gone()
+
+    def _reader_gone(self):
+        self.closed = True
+        # Point the descriptor at devnull so the interpreter's final flush
+        # of this stream does not raise BrokenPipeError again on exit.
+        try:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.stream.fileno())
+            os.close(devnull)
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.stream.flush()
+            except BrokenPipeError:
+                self._reader_gone()
+        if self._owned:
+            self.stream.close()
+        self.closed = True
+
+
+class PrintSink(StreamSink):
+    """Writes each user followed by a blank line, like print(user); print()."""
+
+    def format_batch(self, batch):
+        return ''.join(f"{row}\n\n" for row in iter_rows(batch))
+
+
+class NDJSONSink(StreamSink):
+    """Writes one JSON object per line."""
+
+    def __init__(self, target=None, columns=None):
+        super().__init__(target)
+        self.columns = columns
+
+    def format_batch(self, batch):
+        return ''.join(
+            json.dumps(as_dict(row, self.columns), default=str) + '\n' for row in iter_rows(batch)
+        )
+
+
+class CSVSink(StreamSink):
+    """Writes CSV rows, preceded by a header row unless header=False."""
+
+    def __init__(self, target=None, columns=('user_id', 'name', 'email', 'age'), header=True):
+        super().__init__(target)
+        self.columns = list(columns)
+        self._pending_header = header
+
+    def format_batch(self, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self._pending_header:
+            writer.writerow(self.columns)
+            self._pending_header = False
+        for row in iter_rows(batch):
+            row = as_dict(row, self.columns)
+            writer.writerow([row[column] for column in self.columns])
+        return buffer.getvalue()
+
+
+class CollectorSink(Sink):
+    """Keeps every row in memory, in the `rows` list."""
+
+    def __init__(self):
+        self.rows = []
+
+    def write_batch(self, batch):
+        self.rows.extend(iter_rows(batch))
+
+
+class CallbackSink(Sink):
+    """Hands every batch to `callback`."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write_batch(self, batch):
+        self.callback(batch)
+
+
+class ThreadedSink(Sink):
+    """
+    Wraps another sink and writes to it from a background thread, so
+    reading the next batch from MySQL overlaps with writing this one.
+
+    At most `max_pending` batches wait for the writer. An error raised by
+    the wrapped sink is re-raised by the next write_batch or close.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink, max_pending=4):
+        self.sink = sink
+        self._batches = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    @property
+    def closed(self):
+        return self.sink.closed or self._error is not None
+
+    def _write_loop(self):
+        while True:
+            batch = self._batches.get()
+            if batch is self._STOP:
+                break
+            if self._error is None and not self.sink.closed:
+                try:
+                    self.sink.write_batch(batch)
+                except Exception as e:
+                    self._error = e
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write_batch(self, batch):
+        self._raise_pending_error()
+        self._batches.put(batch)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._batches.put(self._STOP)
+            self._writer.join()
+        self.sink.close()
+        self._raise_pending_error()
+
+
+# Arrow types of the user columns. Ages are unsigned shorts, as in the
+# array('H') of a 'columns' batch, so that array is used without a copy.
+ARROW_TYPES = {'user_id': 'string', 'name': 'string', 'email': 'string', 'age': 'uint16'}
+
+
+def arrow_schema(columns=('user_id', 'name', 'email', 'age')):
+    """The Arrow schema for rows made of `columns`."""
+    return pyarrow.schema([(column, ARROW_TYPES[column]) for column in columns])
+
+
+def to_record_batch(batch, schema):
+    """
+    Builds an Arrow RecordBatch holding a batch in any row format.
+
+    A 'columns' batch goes straight to Arrow column by column, with no
+    Python object per row; its array('H') of ages is wrapped as it is
+    (Arrow buffers are little-endian, like the array on common hardware).
+    """
+    if not isinstance(batch, dict):
+        rows = [as_dict(row, schema.names) for row in batch]
+        batch = {name: [row[name] for row in rows] for name in schema.names}
+    arrays = []
+    for field in schema:
+        values = batch[field.name]
+        if (isinstance(values, array) and values.typecode == 'H'
+                and field.type == pyarrow.uint16() and sys.byteorder == 'little'):
+            arrays.append(pyarrow.Array.from_buffers(field.type, len(values),
+                                                     [None, pyarrow.py_buffer(values)]))
+        else:
+            arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ArrowSink(Sink):
+    """Base class for sinks writing every batch as one Arrow record batch."""
+
+    def __init__(self, target, columns=('user_id', 'name', 'email', 'age')):
+        if pyarrow is None:
+            raise ImportError(f"{type(self).__name__} needs the pyarrow package")
+        self.schema = arrow_schema(columns)
+        self.rows = 0
+        self._writer = self._open(target)
+
+    def _open(self, target):
+        """Returns the writer for `target`, a path or a binary stream."""
+        raise NotImplementedError
+
+    def _write(self, record_batch):
+        self._writer.write_batch(record_batch)
+
+    def write_batch(self, batch):
+        record_batch = to_record_batch(batch, self.schema)
+        if record_batch.num_rows:
+            self._write(record_batch)
+            self.rows += record_batch.num_rows
+
+    def close(self):
+        if not self.closed:
+            self._writer.close()
+        self.closed = True
+
+
+class ParquetSink(ArrowSink):
+    """
+    Writes a Parquet file with one row group per batch, so the row group
+    size is the batch size of the stream feeding the sink.
+    """
+
+    def __init__(self, target, columns=('user_id', 'name', 'email', 'age'), compression='snappy'):
+        self.compression = compression
+        super().__init__(target, columns)
+
+    def _open(self, target):
+        return pyarrow.parquet.ParquetWriter(target, self.schema, compression=self.compression)
+
+    def _write(self, record_batch):
+        self._writer.write_batch(record_batch, row_group_size=record_batch.num_rows)
+
+
+class FeatherSink(ArrowSink):
+    """Writes a Feather (Arrow IPC) file with one record batch per batch."""
+
+    def __init__(self, target, columns=('user_id', 'name', 'email', 'age'), compression='lz4'):
+        self.compression = compression
+        super().__init__(target, columns)
+
+    def _open(self, target):
+        options = pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+        return pyarrow.ipc.new_file(target, self.schema, options=options)
@@ -0,0 +1,162 @@
+"""
+Shared fixtures. Every test runs against a throwaway SQLite database
+(DB_BACKEND=sqlite), so no server is needed.
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+# The modules live one directory up and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends  # noqa: E402
+import seed  # noqa: E402
+
+
+class FetchCounter:
+    """How many rows the cursors handed out, and how many queries were cancelled."""
+
+    def __init__(self):
+        self.rows = 0
+        self.cancelled = 0
+
+    def reset(self):
+        self.rows = self.cancelled = 0
+
+
+class _CountingCursor(backends._SQLiteCursor):
+    """A cursor counting every row it fetches into `counter`."""
+
+    counter = None
+
+    def _count(self, rows):
+        if self.counter is not None:
+            self.counter.rows += rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class _CountingConnection(backends._SQLiteConnection):
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+class DetachedCursor:
+    """
+    Wraps a cursor and hides its `connection` attribute, like the cursors
+    of mysql-connector, which cannot lead back to their connection.
+    """
+
+    def __init__(self, cursor):
+        object.__setattr__(self, '_cursor', cursor)
+
+    def __getattr__(self, name):
+        if name == 'connection':
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute 'connection'")
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class _DetachedCursorConnection(backends._SQLiteConnection):
+    def cursor(self, factory=backends._SQLiteCursor):
+        return DetachedCursor(super().cursor(factory))
+
+
+def make_users(count, start=0):
+    """`count` (user_id, name, email, age) rows with predictable values."""
+    return [(seed.new_user_id(), f"User {i:05d}", f"user{i:05d}@example.com", 18 + i % 80)
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Switches every module to a fresh SQLite file holding an empty
+    user_data table, with a shared pool of its own.
+    """
+    monkeypatch.setattr(backends, 'DB_SQLITE_PATH', str(tmp_path / 'users.sqlite3'))
+    monkeypatch.setattr(backends, '_backend', None)
+    backends.set_backend('sqlite')
+    monkeypatch.setattr(seed, '_pool', seed.ConnectionPool(size=2, timeout=1))
+
+    connection = seed.open_prodev_connection()
+    seed.create_table(connection)
+    connection.close()
+    yield
+    seed.get_pool().close()
+
+
+@pytest.fixture
+def users(database):
+    """Fills user_data with 500 users and returns them in user_id order."""
+    rows = make_users(500)
+    connection = seed.open_prodev_connection()
+    cursor = connection.cursor()
+    cursor.executemany(seed.insert_users_query(), rows)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    # Drop whatever the caches kept from an earlier test's database
+    seed._notify_user_data_change()
+    return sorted(rows)
+
+
+@pytest.fixture
+def fetches(database, monkeypatch):
+    """
+    Counts the rows fetched through every connection opened from now on,
+    and the streaming queries cancelled through Backend.cancel.
+    """
+    counter = FetchCounter()
+    monkeypatch.setattr(_CountingCursor, 'counter', counter)
+    monkeypatch.setattr(backends, '_SQLiteConnection', _CountingConnection)
+
+    backend = backends.get_backend()
+    cancel = backend.cancel
+
+    def counting_cancel(connection, cursor):
+        counter.cancelled += 1
+        cancel(connection, cursor)
+
+    monkeypatch.setattr(backend, 'cancel', counting_cancel)
+    return counter
+
+
+@pytest.fixture
+def detached_cursors(database, monkeypatch):
+    """Every connection opened from now on hands out DetachedCursors."""
+    monkeypatch.setattr(backends, '_SQLiteConnection', _DetachedCursorConnection)
+
+
+def write_csv(path, users):
+    """Writes (name, email, age) rows as a users CSV with its header."""
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+        writer.writerow(['name', 'email', 'age'])
+        writer.writerows(users)
+    return str(path)
@@ -0,0 +1,160 @@
+"""
+aggregate_ages gives the same answers whether the database or the
+streaming path computes them, reads the statistics tables only where
+they are maintained, and falls back to user_data otherwise.
+"""
+import sqlite3
+
+import pytest
+
+import backends
+import seed
+
+stream_ages = __import__('4-stream_ages')
+
+
+class _AbortingCursor(backends._SQLiteCursor):
+    """Refuses every statement after a failed one until a rollback, like PostgreSQL."""
+
+    def execute(self, query, params=()):
+        self.connection.queries.append(query)
+        if self.connection.aborted:
+            raise sqlite3.OperationalError("current transaction is aborted")
+        try:
+            return super().execute(query, params)
+        except sqlite3.Error:
+            self.connection.aborted = True
+            raise
+
+
+class _AbortingConnection(backends._SQLiteConnection):
+    aborted = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = []
+
+    def cursor(self, factory=_AbortingCursor):
+        return super().cursor(factory)
+
+    def rollback(self):
+        self.aborted = False
+        super().rollback()
+
+
+@pytest.fixture
+def aborting(users, monkeypatch):
+    """Pooled connections opened from now on behave like PostgreSQL's on errors."""
+    monkeypatch.setattr(backends, '_SQLiteConnection', _AbortingConnection)
+    opened = []
+    connect = backends.SQLiteBackend.connect
+
+    def recording_connect(backend):
+        opened.append(connect(backend))
+        return opened[-1]
+
+    monkeypatch.setattr(backends.SQLiteBackend, 'connect', recording_connect)
+    return opened
+
+
+def expected(users, func, bucket_size=10):
+    """The aggregate computed in Python from the user tuples."""
+    ages = [user[3] for user in users]
+    if func == 'histogram':
+        histogram = {}
+        for age in ages:
+            bucket = age // bucket_size * bucket_size
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        return dict(sorted(histogram.items()))
+    if not ages:
+        return 0 if func == 'count' else None
+    return {'avg': sum(ages) / len(ages), 'min': min(ages), 'max': max(ages),
+            'count': len(ages)}[func]
+
+
+@pytest.mark.parametrize('func', stream_ages.AGGREGATES)
+@pytest.mark.parametrize('bucket_size', [1, 7, 10])
+def test_streaming_and_sql_paths_agree(users, func, bucket_size):
+    in_sql = stream_ages.aggregate_ages(func, bucket_size=bucket_size)
+    # A predicate keeping every row forces the streaming path; small
+    # blocks make it reduce many of them
+    streamed = stream_ages.aggregate_ages(func, predicate=lambda row: True,
+                                          bucket_size=bucket_size, chunk_size=64)
+    assert in_sql == streamed == expected(users, func, bucket_size)
+    assert type(in_sql) is type(streamed)
+
+
+@pytest.mark.parametrize('func', stream_ages.AGGREGATES)
+def test_streaming_path_applies_the_predicate(users, func):
+    predicate = lambda row: row[1].endswith('7') and int(row[3]) >= 40
+    kept = [user for user in users if predicate(user)]
+    assert kept and len(kept) < len(users)
+    assert stream_ages.aggregate_ages(func, predicate=predicate, chunk_size=50) == expected(kept, func)
+
+
+@pytest.mark.parametrize('func', stream_ages.AGGREGATES)
+def test_no_matching_users(users, func):
+    assert stream_ages.aggregate_ages(func, predicate=lambda row: False) == expected([], func)
+
+
+@pytest.mark.parametrize('func', stream_ages.AGGREGATES)
+def test_empty_table_on_both_paths(database, func):
+    assert (stream_ages.aggregate_ages(func)
+            == stream_ages.aggregate_ages(func, predicate=lambda row: True)
+            == expected([], func))
+
+
+@pytest.mark.parametrize('func', ['avg', 'min', 'max', 'count'])
+def test_backend_without_stats_does_not_read_them(users, aborting, func):
+    assert stream_ages.aggregate_ages(func) == expected(users, func)
+    queries = [query for connection in aborting for query in connection.queries]
+    assert not any('user_stats' in query or 'user_age_histogram' in query for query in queries)
+
+
+@pytest.mark.parametrize('func', ['avg', 'min', 'max', 'count', 'histogram'])
+def test_missing_stats_tables_fall_back_after_a_rollback(users, aborting, monkeypatch, func):
+    # A backend that keeps statistics, on a database that lacks the tables
+    monkeypatch.setattr(backends.get_backend(), 'maintains_stats', True)
+    result = stream_ages.aggregate_ages(func)
+    if func == 'histogram':
+        assert sum(result.values()) == len(users)
+    else:
+        assert result == expected(users, func)
+
+
+# The statistics tables in SQLite's dialect; the MySQL triggers still fail
+SQLITE_STATS_TABLES = [
+    "CREATE TABLE IF NOT EXISTS user_stats (id INTEGER PRIMARY KEY, user_count INTEGER, age_sum INTEGER)",
+    "CREATE TABLE IF NOT EXISTS user_age_histogram (age INTEGER PRIMARY KEY, user_count INTEGER)",
+]
+
+
+def stats_tables():
+    connection = seed.open_prodev_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') "
+                       "AND (name LIKE 'user_stats%' OR name LIKE 'user_age%' "
+                       "OR name LIKE 'user_data_stats%')")
+        return sorted(name for (name,) in cursor.fetchall())
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('failing', ['triggers', 'rebuild'])
+def test_failed_stats_setup_leaves_no_stale_tables(users, monkeypatch, failing):
+    monkeypatch.setattr(backends.get_backend(), 'maintains_stats', True)
+    monkeypatch.setattr(seed, '_STATS_TABLES', SQLITE_STATS_TABLES)
+    if failing == 'rebuild':
+        # Triggers SQLite accepts, so the failure comes from LOCK TABLES
+        monkeypatch.setattr(seed, '_STATS_TRIGGERS', {
+            'user_data_stats_insert': "CREATE TRIGGER user_data_stats_insert AFTER INSERT "
+                                      "ON user_data BEGIN SELECT 1; END",
+        })
+    connection = seed.open_prodev_connection()
+    try:
+        seed.create_stats_tables(connection)
+    finally:
+        connection.close()
+    assert stats_tables() == []
+    assert stream_ages.aggregate_ages('count') == len(users)
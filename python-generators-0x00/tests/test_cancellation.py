@@ -0,0 +1,181 @@
+"""
+Taking only the first rows of a stream costs work for those rows only:
+the query is limited or cancelled instead of read to the end, and the
+connection goes back to the pool.
+"""
+from contextlib import ExitStack, closing
+from itertools import islice
+
+import pytest
+
+import backends
+import seed
+
+stream_users = __import__('0-stream_users').stream_users
+batch_processing = __import__('1-batch_processing')
+lazy_pagination = __import__('2-lazy_paginate')
+stream_ages = __import__('4-stream_ages')
+
+# Rows a stream may fetch beyond the ones it hands over
+SLACK = 1
+
+
+def assert_pool_free():
+    """Every connection of the shared pool can be borrowed right away."""
+    pool = seed.get_pool()
+    with ExitStack() as stack:
+        for _ in range(pool.size):
+            stack.enter_context(pool.connection(timeout=0))
+
+
+def test_islice_of_stream_users(users, fetches):
+    rows = list(islice(stream_users(), 6))
+    assert len(rows) == 6
+    assert fetches.rows <= 6 + SLACK
+    assert fetches.cancelled == 1
+    assert_pool_free()
+
+
+def test_stream_users_limit(users, fetches):
+    assert len(list(stream_users(limit=6))) == 6
+    assert fetches.rows == 6
+    # The query ended on its own, there was nothing to cancel
+    assert fetches.cancelled == 0
+    assert_pool_free()
+
+
+def test_closing_stream_users(users, fetches):
+    with closing(stream_users()) as stream:
+        rows = [next(stream) for _ in range(6)]
+    assert len(rows) == 6
+    assert fetches.rows <= 6 + SLACK
+    assert fetches.cancelled == 1
+    assert_pool_free()
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_closing_stream_users_in_batches(users, fetches, prefetch):
+    batches = batch_processing.stream_users_in_batches(batch_size=6, prefetch=prefetch)
+    with closing(batches):
+        assert len(next(batches)) == 6
+    # The read-ahead thread may have fetched up to `prefetch` more batches
+    assert fetches.rows <= 6 * (prefetch + 2)
+    assert fetches.cancelled == 1
+    assert_pool_free()
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_stream_users_in_batches_limit(users, fetches, prefetch):
+    batches = list(batch_processing.stream_users_in_batches(batch_size=4, prefetch=prefetch,
+                                                            limit=6))
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert fetches.rows == 6
+    assert_pool_free()
+
+
+def test_python_filter_limit_stops_early(users, fetches):
+    # An even age cannot be tested in SQL, so the limit is applied in Python
+    even = [lambda row: row['age'] % 2 == 0]
+    batches = list(batch_processing.stream_users_in_batches(batch_size=4, filters=even, limit=6))
+    rows = [row for batch in batches for row in batch]
+    assert len(rows) == 6
+    assert all(row['age'] % 2 == 0 for row in rows)
+    # About two rows are read per kept one, never the whole table
+    assert fetches.rows <= 2 * 6 + SLACK
+    assert fetches.cancelled == 1
+    assert_pool_free()
+
+
+def test_closing_stream_user_ages(users, fetches):
+    with closing(stream_ages.stream_user_ages()) as ages:
+        assert len(list(islice(ages, 6))) == 6
+    assert fetches.rows <= 6 + SLACK
+    assert fetches.cancelled == 1
+    assert_pool_free()
+
+
+def test_stream_user_ages_limit(users, fetches):
+    assert len(list(stream_ages.stream_user_ages(limit=6))) == 6
+    assert fetches.rows == 6
+    assert fetches.cancelled == 0
+    assert_pool_free()
+
+
+@pytest.mark.parametrize('keyset', [False, True])
+def test_lazy_paginate_limit(users, fetches, keyset):
+    pages = list(lazy_pagination.lazy_paginate(4, keyset=keyset, limit=6))
+    assert [len(page) for page in pages] == [4, 2]
+    assert fetches.rows == 6
+    assert_pool_free()
+
+
+def test_closing_lazy_paginate(users, fetches):
+    with closing(lazy_pagination.lazy_paginate(6)) as pages:
+        assert len(next(pages)) == 6
+    # Only the first page was ever requested
+    assert fetches.rows == 6
+    assert_pool_free()
+
+
+def test_abandoned_stream_leaves_the_pool_usable(users, fetches):
+    for _ in range(seed.get_pool().size + 1):
+        assert len(list(islice(stream_users(), 6))) == 6
+    assert len(list(stream_users())) == len(users)
+
+
+class _KillerCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, query, params=()):
+        self.statements.append(query)
+
+
+class _MySQLConnection:
+    """What MySQLBackend.cancel uses of a mysql-connector connection."""
+
+    def __init__(self, connection_id, statements):
+        self.connection_id = connection_id
+        self.statements = statements
+        self.closed = False
+
+    def cursor(self):
+        return _KillerCursor(self.statements)
+
+    def close(self):
+        self.closed = True
+
+
+class _UnreadCursor:
+    """An unbuffered cursor that refuses to close with rows left unread."""
+
+    def close(self):
+        raise backends.mysql.connector.errors.InternalError("Unread result found")
+
+
+def test_mysql_cancel_kills_the_query_from_a_second_connection(monkeypatch):
+    pytest.importorskip('mysql.connector')
+    backend = backends.MySQLBackend()
+    statements, killers = [], []
+
+    def connect():
+        killers.append(_MySQLConnection(99, statements))
+        return killers[-1]
+
+    monkeypatch.setattr(backend, 'connect', connect)
+    streaming = _MySQLConnection(42, [])
+    backend.cancel(streaming, _UnreadCursor())
+    assert statements == ["KILL QUERY 42"]
+    # The helper connection is closed, the streaming one is left to the pool
+    assert killers[0].closed and not streaming.closed
+
+
+def test_mysql_cancel_survives_an_unreachable_server(monkeypatch):
+    mysql = pytest.importorskip('mysql.connector')
+    backend = backends.MySQLBackend()
+
+    def connect():
+        raise mysql.errors.InterfaceError("Can't connect to MySQL server")
+
+    monkeypatch.setattr(backend, 'connect', connect)
+    backend.cancel(_MySQLConnection(42, []), _UnreadCursor())
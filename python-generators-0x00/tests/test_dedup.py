@@ -0,0 +1,70 @@
+"""
+HashSet builds its sorted array and merges additions into it without
+losing or inventing members, and insert_data drops duplicates with it.
+"""
+import random
+
+import pytest
+
+import backends
+import dedup
+import seed
+from conftest import write_csv
+
+USERS = [(f"User {i}", f"user{i}@example.com", 18 + i % 80) for i in range(150)]
+
+
+@pytest.fixture(params=['chunked', 'single chunk'])
+def small_chunks(request, monkeypatch):
+    """Sorts in several runs, or in one, so the merge of runs is exercised."""
+    monkeypatch.setattr(dedup, 'SORT_CHUNK', 7 if request.param == 'chunked' else 10000)
+
+
+def test_build_from_a_generator(small_chunks):
+    keys = [f"user{i}@example.com" for i in range(500)]
+    hashes = dedup.HashSet(dedup._hash(key) for key in keys)
+    assert list(hashes._sorted) == sorted(dedup._hash(key) for key in keys)
+    assert all(key in hashes for key in keys)
+    assert "nobody@example.com" not in hashes
+    assert hashes.nbytes == 8 * len(keys)
+
+
+def test_additions_are_merged(small_chunks):
+    stored = [f"stored{i}@example.com" for i in range(100)]
+    hashes = dedup.HashSet((dedup._hash(key) for key in stored), merge_every=16)
+    added = [f"added{i}@example.com" for i in range(200)]
+    random.Random(0).shuffle(added)
+    for key in added:
+        hashes.add(key)
+    # Most of the additions went through a merge, the rest are still recent
+    assert len(hashes._recent) < 16
+    assert list(hashes._sorted) == sorted(hashes._sorted)
+    assert all(key in hashes for key in stored + added)
+    assert "nobody@example.com" not in hashes
+
+
+def test_empty_set(small_chunks):
+    hashes = dedup.HashSet()
+    assert "nobody@example.com" not in hashes
+    hashes.add("somebody@example.com")
+    assert "somebody@example.com" in hashes
+
+
+@pytest.mark.parametrize('mode', ['set', 'bloom'])
+def test_insert_data_drops_duplicates(detached_cursors, tmp_path, mode, monkeypatch):
+    # A step of 3 makes the suspects of a batch take several IN queries
+    monkeypatch.setattr(backends.get_backend(), 'max_params', lambda connection: 3)
+    connection = seed.open_prodev_connection()
+    try:
+        first = seed.insert_data(connection, write_csv(tmp_path / 'first.csv', USERS[:100]),
+                                 progress=False)
+        rows = USERS[50:150] + USERS[120:130]
+        report = seed.insert_data(connection, write_csv(tmp_path / 'second.csv', rows),
+                                  batch_size=16, progress=False, dedup=mode)
+    finally:
+        connection.close()
+    assert first.inserted == 100
+    assert report.inserted == 50
+    assert report.duplicates['existing'] == 50
+    assert report.duplicates['in_file'] == 10
+    assert report.duplicates['rejected'] == 0
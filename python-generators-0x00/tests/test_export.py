@@ -0,0 +1,55 @@
+"""
+export_users writes complete files or none at all.
+"""
+import sqlite3
+import sys
+
+import pytest
+
+import seed
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet  # noqa: E402
+
+export = __import__('export')
+
+
+def failing_after(rows):
+    """A filter that keeps every user, then fails like a dropped connection."""
+    seen = []
+
+    def check(row):
+        seen.append(row)
+        if len(seen) > rows:
+            raise sqlite3.OperationalError("connection lost")
+        return True
+    return check
+
+
+def test_export_writes_every_user(users, tmp_path):
+    path = tmp_path / 'users.parquet'
+    assert export.export_users(str(path), batch_size=64) == len(users)
+    table = pyarrow.parquet.read_table(path)
+    assert sorted(table.column('user_id').to_pylist()) == [user[0] for user in users]
+
+
+@pytest.mark.parametrize('prefetch', [0, 1])
+def test_failed_export_raises_and_leaves_no_file(users, tmp_path, prefetch):
+    path = tmp_path / 'users.parquet'
+    with pytest.raises(sqlite3.OperationalError):
+        export.export_users(str(path), batch_size=64, prefetch=prefetch,
+                            filters=[failing_after(200)])
+    assert not path.exists()
+
+
+def test_command_exits_with_an_error(database, tmp_path, monkeypatch):
+    path = tmp_path / 'users.feather'
+    connection = seed.open_prodev_connection()
+    connection.cursor().execute("DROP TABLE user_data")
+    connection.commit()
+    connection.close()
+    monkeypatch.setattr(sys, 'argv', ['export.py', str(path)])
+    with pytest.raises(SystemExit) as exit_info:
+        export.main()
+    assert exit_info.value.code != 0
+    assert not path.exists()
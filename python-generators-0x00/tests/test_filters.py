@@ -0,0 +1,147 @@
+"""
+Filters pushed down to SQL by UserQuery select exactly the rows the
+equivalent Python callables keep.
+"""
+import operator
+
+import pytest
+
+import seed
+from conftest import make_users
+
+batch_processing = __import__('1-batch_processing')
+
+# Names holding the characters LIKE treats specially, and near misses that
+# would match if they were not escaped
+SPECIAL_NAMES = ['50% off', '50x off', '5_0 deal', '5x0 deal', 'a!b', 'a!!b', 'ab']
+
+
+@pytest.fixture
+def people(users):
+    """The fixture users plus a few with LIKE wildcards in their names."""
+    extra = [(user_id, name, f"special{i}@example.com", 30 + i)
+             for i, (name, (user_id, *_)) in enumerate(
+                 zip(SPECIAL_NAMES, make_users(len(SPECIAL_NAMES), start=1000)))]
+    connection = seed.open_prodev_connection()
+    cursor = connection.cursor()
+    cursor.executemany(seed.insert_users_query(), extra)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return users + extra
+
+
+def fetch(filters, columns=None, limit=None, prefetch=0):
+    """The rows stream_users_in_batches returns, as tuples."""
+    return [row for batch in batch_processing.stream_users_in_batches(
+                batch_size=37, prefetch=prefetch, row_format='tuple',
+                filters=filters, columns=columns, limit=limit)
+            for row in batch]
+
+
+_PYTHON_OPS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+               '>': operator.gt, '>=': operator.ge}
+
+def as_callable(condition):
+    """The Python callable equivalent to a (column, op, value) condition."""
+    column, op, value = condition
+    if op in _PYTHON_OPS:
+        return lambda row: _PYTHON_OPS[op](row[column], value)
+    if op == 'in':
+        values = set(value)
+        return lambda row: row[column] in values
+    if op == 'between':
+        low, high = value
+        return lambda row: low <= row[column] <= high
+    if op == 'startswith':
+        return lambda row: row[column].startswith(value)
+    raise ValueError(op)
+
+
+def conditions_for(people):
+    """One condition per operator, with values taken from the data."""
+    user_id = people[42][0]
+    return [
+        ('age', '=', 42),
+        ('age', '!=', 42),
+        ('age', '<', 30),
+        ('age', '<=', 30),
+        ('age', '>', 90),
+        ('age', '>=', 90),
+        ('user_id', '=', user_id),
+        ('user_id', '>', user_id),
+        ('email', '<', 'user00100@example.com'),
+        ('name', 'in', ['User 00007', 'User 00300', 'a!b', 'nobody']),
+        ('age', 'in', []),
+        ('age', 'between', (25, 27)),
+        ('name', 'startswith', 'User 001'),
+        ('name', 'startswith', '50%'),
+        ('name', 'startswith', '5_0'),
+        ('name', 'startswith', 'a!b'),
+        ('name', 'startswith', 'a!'),
+        ('email', 'startswith', 'special'),
+    ]
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_each_operator_matches_its_callable(people, prefetch):
+    for condition in conditions_for(people):
+        assert not seed.UserQuery([condition]).needs_python
+        pushed = fetch([condition], prefetch=prefetch)
+        in_python = fetch([as_callable(condition)], prefetch=prefetch)
+        assert sorted(pushed) == sorted(in_python), condition
+
+
+def test_wildcards_are_matched_literally(people):
+    names = lambda condition: sorted(row[1] for row in fetch([condition]))
+    assert names(('name', 'startswith', '50%')) == ['50% off']
+    assert names(('name', 'startswith', '5_0')) == ['5_0 deal']
+    assert names(('name', 'startswith', 'a!b')) == ['a!b']
+    assert names(('name', 'startswith', 'a!')) == ['a!!b', 'a!b']
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_combined_filters_and_projection(people, prefetch):
+    conditions = [('age', '>=', 40), ('name', 'startswith', 'User 002')]
+    columns = ('email', 'age')
+    pushed = fetch(conditions, columns, prefetch=prefetch)
+    in_python = fetch([as_callable(c) for c in conditions], columns, prefetch=prefetch)
+    # A mix runs the tuples in SQL and the callable in Python
+    mixed = fetch([conditions[0], as_callable(conditions[1])], columns, prefetch=prefetch)
+    assert pushed and all(len(row) == 2 for row in pushed)
+    assert sorted(pushed) == sorted(in_python) == sorted(mixed)
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_limit_on_both_paths(people, prefetch):
+    condition = ('age', '>', 50)
+    matching = set(fetch([condition]))
+    pushed = fetch([condition], limit=20, prefetch=prefetch)
+    in_python = fetch([as_callable(condition)], limit=20, prefetch=prefetch)
+    assert len(pushed) == len(in_python) == 20
+    assert set(pushed) <= matching and set(in_python) <= matching
+    # A limit larger than the result changes nothing
+    assert sorted(fetch([as_callable(condition)], limit=10000, prefetch=prefetch)) == sorted(matching)
+
+
+@pytest.mark.parametrize('row_format', seed.BATCH_FORMATS)
+@pytest.mark.parametrize('columns', [('email', 'age'), ('age',), ('name', 'user_id')])
+def test_projected_rows_in_every_format(people, row_format, columns):
+    condition = ('age', 'between', (30, 40))
+    expected = sorted(fetch([condition], columns))
+    batches = list(batch_processing.stream_users_in_batches(
+        batch_size=37, row_format=row_format, filters=[condition], columns=columns))
+    if row_format == 'columns':
+        assert all(list(batch) == list(columns) for batch in batches)
+        rows = [row for batch in batches for row in zip(*batch.values())]
+    elif row_format == 'dict':
+        rows = [tuple(row[c] for c in columns) for batch in batches for row in batch]
+        assert all(list(row) == list(columns) for batch in batches for row in batch)
+    else:
+        rows = [tuple(row) for batch in batches for row in batch]
+        if row_format == 'namedtuple':
+            assert all(batch[0]._fields == columns for batch in batches)
+    assert sorted(rows) == expected
+    # Ages come back as ints whatever the column type
+    if 'age' in columns:
+        assert all(type(row[columns.index('age')]) is int for row in rows)
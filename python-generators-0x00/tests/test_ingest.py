@@ -0,0 +1,188 @@
+"""
+insert_data and insert_data_parallel load a users CSV with every
+strategy, through cursors that cannot lead back to their connection,
+and a failed load resumes from the offset it reports.
+"""
+import sqlite3
+
+import pytest
+
+import seed
+from conftest import write_csv
+
+# 300 users, then 20 of their emails again
+USERS = [(f"User {i}", f"user{i}@example.com", 18 + i % 80) for i in range(300)]
+CSV_ROWS = USERS + [(f"Again {i}", f"user{i}@example.com", 30) for i in range(0, 200, 10)]
+
+
+def stored_emails():
+    connection = seed.open_prodev_connection()
+    cursor = connection.cursor()
+    cursor.execute("SELECT email FROM user_data")
+    emails = sorted(email for (email,) in cursor.fetchall())
+    cursor.close()
+    connection.close()
+    return emails
+
+
+@pytest.mark.parametrize('strategy', ['auto', 'multi_values', 'executemany'])
+def test_insert_data(detached_cursors, tmp_path, strategy):
+    path = write_csv(tmp_path / 'users.csv', CSV_ROWS)
+    connection = seed.open_prodev_connection()
+    try:
+        report = seed.insert_data(connection, path, batch_size=64, progress=False,
+                                  strategy=strategy)
+    finally:
+        connection.close()
+    assert report.read == len(CSV_ROWS)
+    assert report.inserted == len(USERS)
+    assert report.skipped == len(CSV_ROWS) - len(USERS)
+    assert stored_emails() == sorted(email for _, email, _ in USERS)
+
+
+def test_multi_values_respects_the_parameter_limit(detached_cursors, monkeypatch):
+    statements = []
+    execute = seed._execute_multi_row_insert
+    monkeypatch.setattr(seed, '_execute_multi_row_insert',
+                        lambda cursor, rows: statements.append(len(rows)) or execute(cursor, rows))
+    rows = [(seed.new_user_id(),) + user for user in USERS[:50]]
+    connection = seed.open_prodev_connection()
+    try:
+        cursor = connection.cursor()
+        inserted = seed._insert_multi_values(cursor, rows, max_packet=1 << 20, max_params=40)
+        connection.commit()
+    finally:
+        connection.close()
+    assert inserted == 50
+    # 40 parameters hold 10 rows of 4 columns
+    assert statements == [10] * 5
+
+
+def test_malformed_csv_is_reported(database, tmp_path, capsys):
+    path = write_csv(tmp_path / 'users.csv', USERS[:10] + [("Broken", "broken@example.com", "old")])
+    connection = seed.open_prodev_connection()
+    try:
+        report = seed.insert_data(connection, path, batch_size=4, progress=False)
+    finally:
+        connection.close()
+    assert "An error occurred while reading the CSV file" in capsys.readouterr().out
+    # The two full batches before the bad line were committed
+    assert report.inserted == 8
+
+
+def failing_call(number):
+    """An executemany ingester raising a database error on call `number`."""
+    calls = []
+    send = seed._INGESTERS['executemany']
+
+    def ingest(cursor, rows, max_packet, max_params):
+        calls.append(len(rows))
+        if len(calls) == number:
+            raise sqlite3.OperationalError("disk I/O error")
+        return send(cursor, rows, max_packet, max_params)
+
+    return ingest
+
+
+def test_failed_load_resumes_from_the_reported_offset(database, tmp_path, monkeypatch):
+    path = write_csv(tmp_path / 'users.csv', CSV_ROWS)
+    connection = seed.open_prodev_connection()
+    try:
+        with monkeypatch.context() as patch:
+            patch.setitem(seed._INGESTERS, 'executemany', failing_call(3))
+            failed = seed.insert_data(connection, path, batch_size=64, progress=False,
+                                      strategy='executemany')
+        # The third batch was rolled back; the offset follows the second one
+        assert failed.read == failed.inserted == 128
+        assert len(stored_emails()) == 128
+
+        resumed = seed.insert_data(connection, path, batch_size=64, progress=False,
+                                   strategy='executemany', start_offset=failed.offset)
+    finally:
+        connection.close()
+    assert resumed.read == len(CSV_ROWS) - 128
+    assert failed.inserted + resumed.inserted == len(USERS)
+    assert stored_emails() == sorted(email for _, email, _ in USERS)
+
+
+def test_chunk_offsets_start_the_next_row(tmp_path):
+    # Quoted line breaks and multi-byte characters must not throw the
+    # byte offsets off
+    users = [(f"Zoë\n{i}" if i % 3 else f"User {i}", f"user{i}@example.com", 20 + i)
+             for i in range(25)]
+    path = write_csv(tmp_path / 'users.csv', users)
+    chunks = list(seed.read_csv_chunks(path, chunk_size=4, with_ids=False))
+    assert [row for rows, _ in chunks for row in rows] == users
+    for index, (_, offset) in enumerate(chunks):
+        rest = [row for rows, _ in seed.read_csv_chunks(path, 4, offset, with_ids=False)
+                for row in rows]
+        assert rest == [row for rows, _ in chunks[index + 1:] for row in rows]
+
+
+def test_programming_errors_are_not_reported_as_csv_errors(database, tmp_path, monkeypatch):
+    def broken(cursor, rows, max_packet, max_params):
+        raise AttributeError("no such attribute")
+
+    monkeypatch.setitem(seed._INGESTERS, 'executemany', broken)
+    path = write_csv(tmp_path / 'users.csv', USERS[:10])
+    connection = seed.open_prodev_connection()
+    try:
+        with pytest.raises(AttributeError):
+            seed.insert_data(connection, path, progress=False, strategy='executemany')
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('strategy', ['auto', 'executemany'])
+def test_insert_data_parallel(detached_cursors, tmp_path, strategy):
+    path = write_csv(tmp_path / 'users.csv', CSV_ROWS)
+    report = seed.insert_data_parallel(path, workers=2, batch_size=64, progress=False,
+                                       strategy=strategy, range_bytes=4096)
+    assert report.read == len(CSV_ROWS)
+    assert report.inserted == len(USERS)
+    assert stored_emails() == sorted(email for _, email, _ in USERS)
+
+
+def test_failed_parallel_load_counts_committed_rows_only(database, tmp_path, monkeypatch):
+    monkeypatch.setitem(seed._INGESTERS, 'executemany', failing_call(3))
+    path = write_csv(tmp_path / 'users.csv', CSV_ROWS)
+    report = seed.insert_data_parallel(path, workers=1, batch_size=50, progress=False,
+                                       strategy='executemany')
+    # Two batches were committed; the rest was parsed but never sent
+    assert report.read == 100
+    assert report.inserted == 100
+    assert report.skipped == 0
+    assert report.offset == 0
+    assert len(stored_emails()) == 100
+
+
+class RecordingCursor:
+    """Answers the per-batch statistics queries; has no `connection`."""
+
+    def __init__(self, ages):
+        self.ages = ages
+        self.statements = []
+
+    def execute(self, query, params=()):
+        self.statements.append((query, list(params)))
+
+    def fetchall(self):
+        query, ids = self.statements[-1]
+        counts = {}
+        for user_id in ids:
+            counts[self.ages[user_id]] = counts.get(self.ages[user_id], 0) + 1
+        return list(counts.items())
+
+
+def test_user_stats_are_added_once_per_batch(database):
+    ages = {f"id{i}": 20 + i % 3 for i in range(7)}
+    cursor = RecordingCursor(ages)
+    seed._add_user_stats(cursor, list(ages), max_params=3)
+    lookups, (histogram, histogram_params), (totals, totals_params) = (
+        cursor.statements[:-2], *cursor.statements[-2:])
+    # Seven ids three at a time
+    assert [len(params) for _, params in lookups] == [3, 3, 1]
+    assert histogram.startswith("INSERT INTO user_age_histogram")
+    assert histogram_params == [20, 3, 21, 2, 22, 2]
+    assert totals.startswith("UPDATE user_stats")
+    assert totals_params == [7, sum(ages.values())]
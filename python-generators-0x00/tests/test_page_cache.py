@@ -0,0 +1,36 @@
+"""
+page_cache serves repeated direct page requests and is left alone by
+lazy_paginate walks.
+"""
+lazy_pagination = __import__('2-lazy_paginate')
+page_cache = lazy_pagination.page_cache
+
+
+def test_repeated_page_is_served_from_the_cache(users):
+    before = page_cache.stats()
+    first = lazy_pagination.paginate_users(10, 20)
+    again = lazy_pagination.paginate_users(10, 20)
+    after = page_cache.stats()
+    assert first == again and len(first) == 10
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+
+def test_lazy_walk_does_not_evict_hot_pages(users):
+    hot = lazy_pagination.paginate_users_after(10)
+    before = page_cache.stats()
+    for keyset in (False, True):
+        pages = list(lazy_pagination.lazy_paginate(7, keyset=keyset))
+        assert sum(len(page) for page in pages) == len(users)
+    # The walks neither looked pages up nor stored them
+    assert page_cache.stats() == before
+    assert lazy_pagination.paginate_users_after(10) == hot
+    assert page_cache.stats()['hits'] == before['hits'] + 1
+
+
+def test_estimated_size_grows_with_the_page(users):
+    rows = [tuple(user) for user in users]
+    small = lazy_pagination._estimate_size(rows[:10])
+    large = lazy_pagination._estimate_size(rows[:100])
+    assert lazy_pagination._estimate_size([]) < small < large
+    assert 5 * small < large < 20 * small
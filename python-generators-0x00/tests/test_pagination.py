@@ -0,0 +1,61 @@
+"""
+Keyset pagination walks the whole table in key order, and a Page's
+cursor resumes the walk right after that page.
+"""
+import pytest
+
+import seed
+
+lazy_pagination = __import__('2-lazy_paginate')
+
+
+def keys(pages, key='user_id'):
+    return [row[key] for page in pages for row in page]
+
+
+@pytest.mark.parametrize('key', lazy_pagination.KEYSET_COLUMNS)
+def test_keyset_walk_returns_every_user_in_key_order(users, key):
+    pages = list(lazy_pagination.lazy_paginate(37, keyset=True, key=key))
+    expected = sorted(row[seed.USER_COLUMNS.index(key)] for row in users)
+    assert keys(pages, key) == expected
+    assert all(len(page) == 37 for page in pages[:-1])
+
+
+@pytest.mark.parametrize('key', lazy_pagination.KEYSET_COLUMNS)
+def test_resuming_from_a_cursor_continues_after_that_page(users, key):
+    walk = lazy_pagination.lazy_paginate(37, keyset=True, key=key)
+    seen = [next(walk) for _ in range(4)]
+    walk.close()
+
+    # The cursor carries the key, so only the token is passed back
+    resumed = list(lazy_pagination.lazy_paginate(37, cursor=seen[-1].cursor))
+    walked = keys(seen, key) + keys(resumed, key)
+    assert walked == sorted(walked)
+    assert len(set(walked)) == len(walked) == len(users)
+
+
+def test_cursor_of_the_last_page_resumes_to_nothing(users):
+    *_, last = lazy_pagination.lazy_paginate(100, keyset=True)
+    assert list(lazy_pagination.lazy_paginate(100, cursor=last.cursor)) == []
+
+
+def test_resume_with_a_limit(users):
+    first = next(lazy_pagination.lazy_paginate(50, keyset=True))
+    pages = list(lazy_pagination.lazy_paginate(30, cursor=first.cursor, limit=70))
+    assert [len(page) for page in pages] == [30, 30, 10]
+    assert keys(pages) == [row[0] for row in users[50:120]]
+
+
+def test_cursor_round_trip():
+    token = lazy_pagination.encode_cursor('email', 'user00042@example.com')
+    assert lazy_pagination.decode_cursor(token) == ('email', 'user00042@example.com')
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    lazy_pagination.encode_cursor('user_id', 'x')[:-4],
+    lazy_pagination.encode_cursor('age', 42),
+])
+def test_invalid_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        next(lazy_pagination.lazy_paginate(10, cursor=token))
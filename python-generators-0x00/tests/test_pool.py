@@ -0,0 +1,151 @@
+"""
+ConnectionPool against stand-in connections, so every failure can be
+staged without a server.
+"""
+import sqlite3
+import time
+
+import pytest
+
+import backends
+import seed
+
+
+class FakeConnection:
+    """Records what the pool did to it."""
+
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.unread_result = False
+        self.in_transaction = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBackend(backends.Backend):
+    """Checks connections the way the MySQL backend does."""
+
+    name = 'fake'
+
+    def is_alive(self, connection):
+        return connection.alive and not connection.closed
+
+    def reset(self, connection):
+        if connection.unread_result or not self.is_alive(connection):
+            return False
+        if connection.in_transaction:
+            connection.rollback()
+        return True
+
+
+class Factory:
+    """A connect() stand-in, failing the first `failures` times."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.opened = []
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("server unavailable")
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+
+@pytest.fixture(autouse=True)
+def fake_backend(monkeypatch):
+    monkeypatch.setattr(backends, '_backend', FakeBackend())
+
+
+def make_pool(size=2, timeout=0.05, health_check=True, failures=0):
+    factory = Factory(failures)
+    return seed.ConnectionPool(size, timeout, health_check, connect=factory), factory
+
+
+def test_exhausted_pool_raises_after_the_timeout():
+    pool, factory = make_pool(size=2, timeout=0.05)
+    first, second = pool.acquire(), pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(backends.PoolError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    with pytest.raises(backends.PoolError):
+        pool.acquire(timeout=0)
+    assert len(factory.opened) == 2
+
+    # A released connection is handed out again, not a new one
+    pool.release(first)
+    assert pool.acquire(timeout=0) is first
+    pool.release(second)
+
+
+def test_dead_idle_connection_is_replaced():
+    pool, factory = make_pool(size=1)
+    with pool.connection() as connection:
+        pass
+    connection.alive = False
+    with pool.connection() as replacement:
+        assert replacement is not connection
+    assert connection.closed
+    assert len(factory.opened) == 2
+    # The replacement went back to the pool in its place
+    with pool.connection() as again:
+        assert again is replacement
+
+
+def test_idle_connection_is_not_checked_without_health_check():
+    pool, factory = make_pool(size=1, health_check=False)
+    with pool.connection() as connection:
+        pass
+    connection.alive = False
+    assert pool.acquire(timeout=0) is connection
+
+
+def test_connection_with_unread_result_is_discarded():
+    pool, factory = make_pool(size=1)
+    with pool.connection() as connection:
+        connection.unread_result = True
+    assert connection.closed
+    with pool.connection(timeout=0) as replacement:
+        assert replacement is not connection
+        replacement.in_transaction = True
+    # An open transaction is only rolled back; the connection is kept
+    assert replacement.rollbacks == 1 and not replacement.closed
+    assert pool.acquire(timeout=0) is replacement
+
+
+def test_discard_on_release():
+    pool, factory = make_pool(size=1)
+    connection = pool.acquire()
+    pool.release(connection, discard=True)
+    assert connection.closed
+    assert pool.acquire(timeout=0) is not connection
+
+
+def test_slot_is_released_when_connect_fails():
+    pool, factory = make_pool(size=2, failures=5)
+    for _ in range(5):
+        with pytest.raises(sqlite3.OperationalError):
+            pool.acquire(timeout=0)
+    # Every failed attempt gave its slot back, so both are still free
+    first, second = pool.acquire(timeout=0), pool.acquire(timeout=0)
+    assert {first.number, second.number} == {0, 1}
+
+
+def test_close_closes_idle_connections_only():
+    pool, factory = make_pool(size=2)
+    idle, borrowed = pool.acquire(), pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert idle.closed and not borrowed.closed
+    pool.release(borrowed)
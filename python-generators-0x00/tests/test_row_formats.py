@@ -0,0 +1,121 @@
+"""
+Every generator returns the same users in every row format, and a limit
+asks the database for only the rows still wanted.
+"""
+import asyncio
+
+import pytest
+
+import seed
+
+stream_users = __import__('0-stream_users')
+batch_processing = __import__('1-batch_processing')
+lazy_pagination = __import__('2-lazy_paginate')
+async_streams = __import__('async_streams')
+
+
+def as_tuple(row):
+    """A row in any of seed.ROW_FORMATS as a plain tuple."""
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def check_format(rows, row_format):
+    """Asserts every row has the shape `row_format` promises, with int ages."""
+    for row in rows:
+        if row_format == 'dict':
+            assert list(row) == list(seed.USER_COLUMNS)
+        elif row_format == 'namedtuple':
+            assert isinstance(row, seed.UserRow)
+        else:
+            assert type(row) is tuple
+        assert type(as_tuple(row)[3]) is int
+
+
+def collect(agen):
+    """Runs an async generator to the end and returns what it yielded."""
+    async def run():
+        return [item async for item in agen]
+    return asyncio.run(run())
+
+
+GENERATORS = {
+    'stream_users': lambda fmt: list(stream_users.stream_users(row_format=fmt)),
+    'stream_users_parallel': lambda fmt: list(stream_users.stream_users_parallel(
+        workers=3, batch_size=40, row_format=fmt)),
+    'stream_users_in_batches': lambda fmt: [row for batch in batch_processing.stream_users_in_batches(
+        batch_size=37, row_format=fmt) for row in batch],
+    'prefetched_batches': lambda fmt: [row for batch in batch_processing.stream_users_in_batches(
+        batch_size=37, prefetch=2, row_format=fmt) for row in batch],
+    'paginate_users': lambda fmt: lazy_pagination.paginate_users(1000, 0, row_format=fmt,
+                                                                 cache=False),
+    'lazy_paginate': lambda fmt: [row for page in lazy_pagination.lazy_paginate(
+        37, row_format=fmt) for row in page],
+    'keyset_paginate': lambda fmt: [row for page in lazy_pagination.lazy_paginate(
+        37, keyset=True, row_format=fmt) for row in page],
+    'async_stream_users': lambda fmt: collect(async_streams.async_stream_users(
+        batch_size=37, row_format=fmt)),
+    'async_lazy_paginate': lambda fmt: [row for page in collect(async_streams.async_lazy_paginate(
+        37, row_format=fmt)) for row in page],
+}
+
+
+@pytest.mark.parametrize('row_format', seed.ROW_FORMATS)
+@pytest.mark.parametrize('generator', GENERATORS)
+def test_every_generator_in_every_format(users, generator, row_format):
+    rows = GENERATORS[generator](row_format)
+    check_format(rows, row_format)
+    assert sorted(as_tuple(row) for row in rows) == users
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_columns_batches(users, prefetch):
+    batches = list(batch_processing.stream_users_in_batches(batch_size=37, prefetch=prefetch,
+                                                            row_format='columns'))
+    assert all(list(batch) == list(seed.USER_COLUMNS) for batch in batches)
+    assert all(batch['age'].typecode == 'H' for batch in batches)
+    assert [len(batch['user_id']) for batch in batches[:-1]] == [37] * (len(batches) - 1)
+    assert sorted(row for batch in batches for row in zip(*batch.values())) == users
+
+
+def test_unknown_format_is_rejected(users):
+    with pytest.raises(ValueError):
+        seed.row_converter('columns')
+    with pytest.raises(ValueError):
+        next(stream_users.stream_users(row_format='xml'))
+
+
+def test_stream_users_limit_fetches_only_the_rows_wanted(users, fetches):
+    rows = list(stream_users.stream_users(row_format='tuple', limit=25))
+    assert len(rows) == 25 and set(rows) <= set(users)
+    assert fetches.rows == 25
+    assert fetches.cancelled == 0
+
+
+@pytest.mark.parametrize('keyset', [False, True])
+def test_lazy_paginate_limit_shrinks_the_last_page(users, fetches, keyset):
+    pages = list(lazy_pagination.lazy_paginate(30, keyset=keyset, row_format='tuple', limit=75))
+    assert [len(page) for page in pages] == [30, 30, 15]
+    assert fetches.rows == 75
+
+
+@pytest.mark.parametrize('row_format', seed.BATCH_FORMATS)
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_batches_limit_in_every_format(users, fetches, row_format, prefetch):
+    batches = list(batch_processing.stream_users_in_batches(
+        batch_size=30, prefetch=prefetch, row_format=row_format, limit=75))
+    sizes = [len(batch['age']) if row_format == 'columns' else len(batch) for batch in batches]
+    assert sizes == [30, 30, 15]
+    # The limit went into the query, so nothing past it was read
+    assert fetches.rows == 75
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_limit_after_a_python_filter_cancels_the_query(users, fetches, prefetch):
+    keep = lambda row: row['age'] % 2 == 0
+    batches = list(batch_processing.stream_users_in_batches(
+        batch_size=30, prefetch=prefetch, row_format='tuple', filters=[keep], limit=40))
+    rows = [row for batch in batches for row in batch]
+    assert len(rows) == 40 and all(row[3] % 2 == 0 for row in rows)
+    # The rest of the table was left unread
+    assert fetches.rows < len(users)
+    assert fetches.cancelled == 1
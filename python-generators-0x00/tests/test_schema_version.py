@@ -0,0 +1,86 @@
+"""
+Queries are built for the layout the live table has, not for the one
+seen when the modules were imported.
+"""
+import os
+
+import pytest
+
+import backends
+import seed
+from conftest import write_csv
+
+lazy_pagination = __import__('2-lazy_paginate')
+
+
+def test_sqlite_tables_use_the_first_layout(database):
+    assert seed.schema_version() == 1
+    assert seed.schema_version(refresh=True) == 1
+    assert 'BIN_TO_UUID' not in seed.select_users()
+
+
+def test_queries_follow_a_layout_change(database, monkeypatch):
+    before = seed.UserQuery([('user_id', '=', 'x')], limit=5)
+    # What migrate_to_v2 leaves behind once it has swapped the tables
+    monkeypatch.setattr(seed, '_schema_version', 2)
+    after = seed.UserQuery([('user_id', '=', 'x')], limit=5)
+
+    assert 'BIN_TO_UUID(user_id) AS user_id' not in before.sql
+    assert 'BIN_TO_UUID(user_id) AS user_id' in after.sql
+    assert 'user_id = UUID_TO_BIN(%s)' in after.sql
+    assert seed.select_users().startswith('SELECT BIN_TO_UUID(user_id) AS user_id,')
+    assert '(UUID_TO_BIN(%s), %s, %s, %s)' in seed.insert_users_query()
+    # Version 2 ids are time ordered (UUIDv7)
+    assert seed.new_user_id()[14] == '7'
+
+
+class LayoutCursor:
+    """Reports user_id as `data_type` to the layout check."""
+
+    def __init__(self, data_type):
+        self.data_type = data_type
+        self.queries = []
+
+    def execute(self, query, params=()):
+        self.queries.append(query)
+
+    def fetchone(self):
+        return (self.data_type,)
+
+
+def test_version_1_writes_fail_once_the_table_is_swapped(database, monkeypatch):
+    monkeypatch.setattr(backends.get_backend(), 'name', 'mysql')
+    monkeypatch.setattr(seed, '_schema_version', 1)
+    seed._check_schema_version(LayoutCursor('varchar'))
+    with pytest.raises(backends.SchemaError):
+        seed._check_schema_version(LayoutCursor('binary'))
+    assert isinstance(backends.SchemaError(), backends.Error)
+
+    # A process already on version 2 has nothing to check
+    monkeypatch.setattr(seed, '_schema_version', 2)
+    cursor = LayoutCursor('binary')
+    seed._check_schema_version(cursor)
+    assert cursor.queries == []
+
+
+def test_batch_failing_the_layout_check_is_rolled_back(database, tmp_path, monkeypatch):
+    checks = []
+
+    def swapped_after_first_batch(cursor):
+        checks.append(cursor)
+        if len(checks) > 1:
+            raise backends.SchemaError("user_data was migrated")
+
+    monkeypatch.setattr(seed, '_check_schema_version', swapped_after_first_batch)
+    users = [(f"User {i}", f"user{i}@example.com", 30) for i in range(10)]
+    connection = seed.open_prodev_connection()
+    try:
+        report = seed.insert_data(connection, write_csv(tmp_path / 'users.csv', users),
+                                  batch_size=4, progress=False)
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        stored = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    assert report.inserted == stored == 4
+    assert report.offset < os.path.getsize(tmp_path / 'users.csv')
@@ -0,0 +1,165 @@
+"""
+Sinks write whole batches in every row format, ThreadedSink keeps the
+order and holds the producer back when the writer falls behind, and
+batch_processing stops reading once its sink is closed.
+"""
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+import seed
+
+batch_processing = __import__('1-batch_processing')
+sinks = __import__('sinks')
+
+ROWS = [('id1', 'Ann', 'ann@example.com', 31), ('id2', 'Bob', 'bob@example.com', 47)]
+
+
+def batch_in(row_format):
+    """ROWS as a batch in one of seed.BATCH_FORMATS."""
+    return seed.batch_converter(row_format)(ROWS)
+
+
+class BrokenPipe(io.StringIO):
+    """A stream whose reader goes away after `writes` writes."""
+
+    def __init__(self, writes=0):
+        super().__init__()
+        self.writes = writes
+
+    def write(self, text):
+        if self.writes == 0:
+            raise BrokenPipeError
+        self.writes -= 1
+        return super().write(text)
+
+
+class GatedSink(sinks.CollectorSink):
+    """Collects batches, but only once `gate` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.batches = []
+
+    def write_batch(self, batch):
+        self.gate.wait()
+        self.batches.append(batch)
+
+
+@pytest.mark.parametrize('row_format', seed.BATCH_FORMATS)
+def test_stream_sinks_in_every_format(row_format):
+    printed, ndjson, csv_text = io.StringIO(), io.StringIO(), io.StringIO()
+    for sink in (sinks.PrintSink(printed), sinks.NDJSONSink(ndjson), sinks.CSVSink(csv_text)):
+        sink.write_batch(batch_in(row_format))
+        sink.close()
+        # A stream that was passed in is left open
+        assert not sink.stream.closed
+
+    # A 'columns' batch is printed as one dict per row
+    assert printed.getvalue() == ''.join(
+        f"{row}\n\n" for row in sinks.iter_rows(batch_in(row_format)))
+    assert [json.loads(line) for line in ndjson.getvalue().splitlines()] == [
+        dict(zip(seed.USER_COLUMNS, row)) for row in ROWS]
+    assert list(csv.reader(io.StringIO(csv_text.getvalue()))) == [
+        list(seed.USER_COLUMNS)] + [[str(value) for value in row] for row in ROWS]
+
+
+def test_csv_sink_writes_the_header_once(tmp_path):
+    path = tmp_path / 'users.csv'
+    with sinks.CSVSink(str(path), columns=('email', 'age')) as sink:
+        sink.write_batch(batch_in('dict'))
+        sink.write_batch(batch_in('namedtuple'))
+    assert sink.stream.closed
+    assert path.read_text().splitlines() == [
+        'email,age', 'ann@example.com,31', 'bob@example.com,47',
+        'ann@example.com,31', 'bob@example.com,47']
+
+
+def test_broken_pipe_closes_the_sink():
+    sink = sinks.NDJSONSink(BrokenPipe(writes=1))
+    sink.write_batch(batch_in('dict'))
+    assert not sink.closed
+    sink.write_batch(batch_in('dict'))
+    assert sink.closed
+    # Later writes and the close are dropped quietly
+    sink.write_batch(batch_in('dict'))
+    sink.close()
+    assert len(sink.stream.getvalue().splitlines()) == len(ROWS)
+
+
+def test_callback_sink_gets_whole_batches(users):
+    sizes = []
+    batch_processing.batch_processing(batch_size=40, filters=None,
+                                      sink=sinks.CallbackSink(lambda batch: sizes.append(len(batch))))
+    assert sum(sizes) == len(users)
+    assert sizes[:-1] == [40] * (len(sizes) - 1)
+
+
+def test_batch_processing_fills_a_collector(users):
+    sink = sinks.CollectorSink()
+    batch_processing.batch_processing(batch_size=40, sink=sink)
+    assert sink.closed
+    assert sorted(tuple(row.values()) for row in sink.rows) == [
+        user for user in users if user[3] > 25]
+
+
+@pytest.mark.parametrize('threaded', [False, True])
+def test_closed_sink_stops_the_stream(users, fetches, threaded):
+    sink = sinks.NDJSONSink(BrokenPipe(writes=2))
+    if threaded:
+        sink = sinks.ThreadedSink(sink, max_pending=1)
+    batch_processing.batch_processing(batch_size=20, filters=None, sink=sink)
+    assert sink.closed
+    # The query was cancelled instead of read to the end
+    assert fetches.cancelled == 1
+    assert fetches.rows < len(users)
+
+
+def test_threaded_sink_keeps_the_order(users):
+    direct, threaded = sinks.CollectorSink(), sinks.CollectorSink()
+    batch_processing.batch_processing(batch_size=30, filters=None, sink=direct)
+    batch_processing.batch_processing(batch_size=30, filters=None,
+                                      sink=sinks.ThreadedSink(threaded, max_pending=2))
+    assert threaded.closed
+    assert len(threaded.rows) == len(users)
+    assert threaded.rows == direct.rows
+
+
+def test_threaded_sink_applies_backpressure():
+    inner = GatedSink()
+    sink = sinks.ThreadedSink(inner, max_pending=2)
+    written = []
+
+    def produce():
+        for i in range(6):
+            sink.write_batch([i])
+            written.append(i)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    # One batch is with the stuck writer and two wait in the queue; the
+    # producer is held on the fourth
+    producer.join(timeout=0.5)
+    assert producer.is_alive()
+    assert written == [0, 1, 2]
+
+    inner.gate.set()
+    producer.join(timeout=5)
+    sink.close()
+    assert written == list(range(6))
+    assert inner.batches == [[i] for i in range(6)]
+    assert inner.closed
+
+
+def test_threaded_sink_reraises_the_writer_error():
+    def fail(batch):
+        raise ValueError("cannot write")
+
+    sink = sinks.ThreadedSink(sinks.CallbackSink(fail))
+    sink.write_batch(batch_in('tuple'))
+    with pytest.raises(ValueError, match="cannot write"):
+        sink.close()